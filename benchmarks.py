@@ -0,0 +1,197 @@
+"""
+Micro-benchmarks for the local comment analysis in finally.py.
+
+Usage:
+    python benchmarks.py normalization [--comments comments.txt] [--repeat 200]
+    python benchmarks.py fuzzy [--comments comments.txt] [--repeat 200]
+    python benchmarks.py language [--comments comments.txt] [--repeat 200]
+
+--comments takes a UTF-8 file with one comment per line (e.g. exported from a page);
+without it a built-in sample of our usual comment mix is used.
+"""
+import argparse
+import importlib
+import re
+import time
+
+# "finally" is a Python keyword, so the bot module can't be imported with a plain import statement
+bot_module = importlib.import_module("finally")
+
+SAMPLE_COMMENTS = [
+    "price?", "dam koto", "koto dam bhai?", "inbox plz", "Price koto???", "details please",
+    "আসসালামু আলাইকুম", "দাম কত?", "কত টাকা ভাই", "ইনবক্স চেক করুন", "অনেক সুন্দর হয়েছে 😍",
+    "kmon asen?", "apu delivery charge koto dhaka te", "bhai order korte chai", "size ki ki ache",
+    "nice 👍", "👍", "❤️❤️❤️", "wow!!!!!", "Good product, fast delivery. Thanks!",
+    "This is a scam, never buying again!!!", "fuuuuck this", "f.u.c.k", "খানকির পোলা", "magir pola",
+    "Hello, is cash on delivery available?", "Hi there, what colors do you have?",
+    "নমস্কার, কবে পাবো?", "kaise ho bhai", "पैसा कितना है?", "ni hao", "مرحبا كم السعر",
+    "Mr. Rahman, apnar page ta onek valo", "apni ki reply diben?", "tumi kothay thako",
+    "https://www.example.com/product/123 ekhane ki pawa jabe?", "01712345678 call me",
+]
+
+# Misspelled slang the exact matcher misses, and clean words close to the lexicon, for the fuzzy benchmark
+OBFUSCATED_SLANG = ["fcuk", "bicth", "fukc this", "biatch", "motherfuker", "whoer", "sltu", "cnut", "fuckng hell"]
+INFLECTED_SLANG = ["whores", "fuckers", "sluts", "cunts", "fucks", "bitches", "fucked"]
+CLEAN_NEAR_MISSES = [
+    "good luck", "duck curry", "new batch?", "pitch black", "where is it", "whole set koto", "count koto",
+    "cut piece", "slot ache?", "brand new", "random color", "bitter", "fund", "rant", "coupon", "cult classic",
+    "ducks", "new batches", "witches hat", "counts", "slots", "brands", "ranted",
+]
+
+
+def load_comments(path):
+    if not path:
+        return SAMPLE_COMMENTS
+    with open(path, encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+def time_per_comment(func, comments, repeat):
+    """Average microseconds per comment for func over `repeat` passes of the comment list."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for comment in comments:
+            func(comment)
+    return (time.perf_counter() - start) / (repeat * len(comments)) * 1e6
+
+
+def legacy_clean_text_for_slang(text):
+    """clean_text_for_slang as it was before the translate table: one str.replace per symbol."""
+    text = text.lower()
+    symbol_replacements = {
+        '@': 'a', '3': 'e', '1': 'i', '0': 'o', '5': 's',
+        '$': 's', '7': 't', '4': 'a', '!': 'i', '*': '',
+        '#': '', '%': '', '&': '', '+': '', '=': '',
+        '_': ' ', '-': ' ',
+        '.': ' ', ',': ' ', ';': ' ', ':': ' ',
+        '(': ' ', ')': ' ', '[': ' ', ']': ' ', '{': ' ', '}': ' ',
+        '<': ' ', '>': ' ', '/': ' ', '\\': ' ', '|': ' '
+    }
+    for symbol, replacement in symbol_replacements.items():
+        text = text.replace(symbol, replacement)
+    text = re.sub(r'\s+', ' ', text).strip()
+    text = re.sub(r'(.)\1{2,}', r'\1\1', text)
+    return text
+
+
+def legacy_normalization(text):
+    """What one comment used to cost: a slang clean plus separate lower() calls per analysis step."""
+    legacy_clean_text_for_slang(text)
+    text.lower().strip()  # contains_slang
+    text.lower()  # get_sentiment
+    text.lower()  # detect_comment_language
+    text.lower()  # analyze_name_patterns
+
+
+def benchmark_normalization(comments, repeat):
+    mismatches = [c for c in comments if legacy_clean_text_for_slang(c) != bot_module.clean_text_for_slang(c)]
+    print(f"Comments: {len(comments)}, repeat: {repeat}, output mismatches vs legacy: {len(mismatches)}")
+    for label, func in [
+        ("legacy clean_text_for_slang", legacy_clean_text_for_slang),
+        ("clean_text_for_slang", bot_module.clean_text_for_slang),
+        ("legacy per-comment normalization", legacy_normalization),
+        ("normalize_comment", bot_module.normalize_comment),
+    ]:
+        print(f"  {label:<34} {time_per_comment(func, comments, repeat):8.2f} us/comment")
+
+
+def legacy_detect_language(comment):
+    """detect_comment_language as it was before the script table: one regex and indicator loop per language."""
+    if not comment or len(comment.strip()) == 0:
+        return "english"
+    bangla_chars = len(re.findall(r'[\u0980-\u09FF]', comment))
+    hindi_chars = len(re.findall(r'[\u0900-\u097F]', comment))
+    arabic_chars = len(re.findall(r'[\u0600-\u06FF]', comment))
+    chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', comment))
+    japanese_chars = len(re.findall(r'[\u3040-\u309F\u30A0-\u30FF]', comment))
+    english_chars = len(re.findall(r'[a-zA-Z]', comment))
+    comment_lower = comment.lower()
+    bangla_indicators = ['kemon', 'koto', 'taka', 'bhai', 'apa', 'dhonnobad', 'valo', 'bhalo']
+    hindi_indicators = ['kaise', 'kya', 'hai', 'aap', 'main', 'paisa', 'rupees', 'ji', 'sahab']
+    chinese_indicators = ['ni', 'hao', 'shi', 'wo', 'yuan', 'kuai', 'xie']
+    japanese_indicators = ['arigatou', 'sumimasen', 'konnichiwa', 'desu', 'masu', 'yen']
+    arabic_indicators = ['salam', 'habibi', 'wallah', 'inshallah', 'mashallah']
+    bangla_roman = sum(1 for word in bangla_indicators if word in comment_lower)
+    hindi_roman = sum(1 for word in hindi_indicators if word in comment_lower)
+    chinese_roman = sum(1 for word in chinese_indicators if word in comment_lower)
+    japanese_roman = sum(1 for word in japanese_indicators if word in comment_lower)
+    arabic_roman = sum(1 for word in arabic_indicators if word in comment_lower)
+    scores = {
+        'bangla': bangla_chars + bangla_roman * 2,
+        'hindi': hindi_chars + hindi_roman * 2,
+        'arabic': arabic_chars + arabic_roman * 2,
+        'chinese': chinese_chars + chinese_roman * 2,
+        'japanese': japanese_chars + japanese_roman * 2,
+        'english': english_chars * 0.3
+    }
+    max_score = max(scores.values())
+    if max_score == 0:
+        return "english"
+    detected_language = max(scores, key=scores.get)
+    significant_languages = [lang for lang, score in scores.items() if score > max_score * 0.4]
+    if len(significant_languages) > 1:
+        return "mixed"
+    return detected_language
+
+
+def benchmark_language(comments, repeat):
+    mismatches = [c for c in comments if legacy_detect_language(c) != bot_module.detect_language(c)]
+    print(f"Comments: {len(comments)}, repeat: {repeat}, label mismatches vs legacy: {len(mismatches)}")
+    for label, func in [
+        ("legacy detect_comment_language", legacy_detect_language),
+        ("detect_language", bot_module.detect_language),
+    ]:
+        print(f"  {label:<34} {time_per_comment(func, comments, repeat):8.2f} us/comment")
+
+
+def benchmark_fuzzy(comments, repeat):
+    """
+    Throughput with and without fuzzy slang matching, plus what fuzzy matching adds. Check the
+    false positive rate on a page export before setting SLANG_FUZZY_MAX_DISTANCE above 0.
+    """
+    matcher = bot_module.SlangMatcher.from_lexicon(bot_module.DEFAULT_SLANG_LEXICON)
+    normalized = [bot_module.normalize_comment(c) for c in comments]
+
+    def flags(distance):
+        return [bool(matcher.find(n["cleaned"], n["lower"].strip(), distance)) for n in normalized]
+
+    print(f"\nComments: {len(comments)}, repeat: {repeat}")
+    exact = flags(0)
+    for distance in (0, 1, 2):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for n in normalized:
+                matcher.find(n["cleaned"], n["lower"].strip(), distance)
+        per_comment = (time.perf_counter() - start) / (repeat * len(normalized)) * 1e6
+        flagged = flags(distance)
+        added = [c for c, before, after in zip(comments, exact, flagged) if after and not before]
+        print(f"  max distance {distance}: {per_comment:8.2f} us/comment, flagged {sum(flagged)}, "
+              f"added by fuzzy {len(added)}: {added}")
+
+    for distance in (1, 2):
+        caught = [c for c in OBFUSCATED_SLANG if matcher.check(c, fuzzy_max_distance=distance)[1]]
+        inflected = [c for c in INFLECTED_SLANG if matcher.check(c, fuzzy_max_distance=distance)[1]]
+        false_positives = [c for c in CLEAN_NEAR_MISSES if matcher.check(c, fuzzy_max_distance=distance)[1]]
+        print(f"  max distance {distance}: caught {len(caught)}/{len(OBFUSCATED_SLANG)} misspellings, "
+              f"{len(inflected)}/{len(INFLECTED_SLANG)} inflections, "
+              f"false positive rate {len(false_positives) / len(CLEAN_NEAR_MISSES):.1%} {false_positives}")
+
+
+BENCHMARKS = {
+    "normalization": benchmark_normalization,
+    "fuzzy": benchmark_fuzzy,
+    "language": benchmark_language,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for local comment analysis")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--comments", help="File with one comment per line (default: built-in sample)")
+    parser.add_argument("--repeat", type=int, default=200, help="Passes over the comment list")
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](load_comments(args.comments), args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Compiles the moderation lexicon (the data file at SLANG_LEXICON_PATH, or DEFAULT_SLANG_LEXICON
+in finally.py) into the artifact FacebookBot loads at startup.
+
+Usage:
+    python build_lexicon.py [--lexicon slang_lexicon.json] [--output slang_lexicon.bin]
+    python build_lexicon.py --export-json slang_lexicon.json
+
+Run it after every lexicon change; it fails if the lexicon flags any of the clean comments in
+CLEAN_COMMENT_REGRESSIONS or misses any of the offensive ones in OFFENSIVE_COMMENT_REGRESSIONS. The bot still starts without an up-to-date artifact, but then
+compiles the lexicon itself on every start (and on every hot reload).
+--export-json writes the active lexicon to a data file, as a starting point for editing.
+"""
+import argparse
+import importlib
+import json
+import os
+import time
+
+# "finally" is a Python keyword, so the bot module can't be imported with a plain import statement
+bot_module = importlib.import_module("finally")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the precompiled slang lexicon artifact")
+    parser.add_argument("--lexicon", default=bot_module.SLANG_LEXICON_PATH,
+                        help="Lexicon data file (default: SLANG_LEXICON_PATH)")
+    parser.add_argument("--output", default=bot_module.SLANG_LEXICON_ARTIFACT,
+                        help="Artifact path (default: SLANG_LEXICON_ARTIFACT)")
+    parser.add_argument("--export-json", metavar="PATH", help="Write the lexicon to a JSON data file and exit")
+    args = parser.parse_args()
+    lexicon = bot_module.read_lexicon_source(args.lexicon)
+
+    if args.export_json:
+        with open(args.export_json, "w", encoding="utf-8") as f:
+            json.dump(lexicon, f, ensure_ascii=False, indent=2)
+        print(f"Wrote lexicon {bot_module.get_lexicon_version(lexicon)} to {args.export_json}")
+        return
+
+    start = time.perf_counter()
+    version = bot_module.build_lexicon_artifact(args.output, lexicon)
+    print(f"Built slang lexicon {version} -> {args.output} "
+          f"({os.path.getsize(args.output) / 1024:.0f} KiB, {(time.perf_counter() - start) * 1000:.0f}ms)")
+
+    start = time.perf_counter()
+    artifact = bot_module.read_lexicon_artifact(args.output)
+    print(f"Artifact loads in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    matcher = bot_module.SlangMatcher.from_compiled(artifact["matcher"])
+    regressions = bot_module.find_clean_regressions(matcher)
+    if regressions:
+        raise SystemExit(f"Lexicon flags clean comments (CLEAN_COMMENT_REGRESSIONS): {regressions}")
+    missed = bot_module.find_offensive_regressions(matcher)
+    if missed:
+        raise SystemExit(f"Lexicon misses offensive comments (OFFENSIVE_COMMENT_REGRESSIONS): {missed}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,1862 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
+import array
+import asyncio
+import functools
+import hashlib
+import itertools
+import json
+import mmap
+import multiprocessing
 import os
+import queue
+import random
 import re
 import requests
+import sys
+import threading
 import time
+import unicodedata
+import uuid
+import zlib
+from urllib.parse import urlsplit
+from collections import OrderedDict, deque
+from concurrent.futures import Future, InvalidStateError, ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from datetime import datetime
 from dotenv import load_dotenv
 import tiktoken  # Library for token counting
+from upstream_http import (UPSTREAM_POOL_SIZE, UPSTREAM_WARMUP_CONNECTIONS, create_http_session,
+                           get_http_session_stats, warm_up_http_session)
+
+try:
+    import httpx  # Non-blocking HTTP client, only needed for the ASGI serving path (asgi_app)
+except ImportError:
+    httpx = None
+try:
+    import numpy as np  # Only needed for the optional romanized-language classifier (LanguageModel)
+except ImportError:
+    np = None
 
 # Load environment variables from .env file
 load_dotenv()
 
 app = Flask(__name__)
 
+# --- Pooled HTTP session for upstream calls ---
+# One keep-alive session for every OpenRouter call (and job callbacks), shared with withou_slang.py
+# through upstream_http.py.
+http_session = create_http_session(UPSTREAM_POOL_SIZE)
+
+# --- Prompt layout ---
+# The system prompt is kept byte-identical across all requests (no names, dates or page details),
+# so OpenRouter/OpenAI prompt caching can reuse it. Page, post and comment specifics follow it as
+# separate messages in generate_reply.
+STATIC_SYSTEM_PROMPT = """You are an AI assistant for a company's Facebook page.
+Your goal is to provide concise, helpful, and friendly replies to comments.
+The page, post and comment details are given in the messages after these rules.
+
+CRITICAL COMMENTER NAME RULE:
+- You MUST start your reply by addressing the commenter by the name given in COMMENT CONTEXT
+- ALWAYS begin your response with "<name>," or "<name> ভাই/আপা" for Bengali
+- This is MANDATORY - every reply must include the commenter's name at the beginning
+
+CRITICAL LANGUAGE RULE:
+- You MUST respond in the SAME language as the user's comment
+- If they write in Bengali/Bangla → Reply ONLY in Bengali/Bangla (বাংলা)
+- If they write in English → Reply ONLY in English
+- If they write in Hindi → Reply ONLY in Hindi (हिंदी)
+- If they write in Chinese → Reply ONLY in Chinese (中文)
+- If they write in Japanese → Reply ONLY in Japanese (日本語)
+- If they write in Arabic → Reply ONLY in Arabic (العربية)
+- If mixed languages → Use the predominant language or Bengali as fallback
+
+CRITICAL NAME CONSISTENCY RULES:
+- Analyze HOW names are mentioned in the user's comment (see the name pattern analysis in COMMENT CONTEXT)
+- If user uses formal address (আপনি/sir/madam): Use formal address in reply
+- If user uses informal address (তুমি/you): Use informal address in reply
+- If user mentions company/page name: Mention it similarly in reply
+- If user uses honorifics (জনাব/mr./dr.): Use appropriate honorifics in reply
+- If user is casual with names: Be casual in reply
+- If user is formal with names: Be formal in reply
+- MATCH the user's style of addressing people and organizations
+
+RESPONSE GUIDELINES:
+- ALWAYS start with the commenter's name
+- Keep replies very short: 1-2 sentences maximum
+- Be friendly, helpful, and professional
+- Mention the company name from PAGE CONTEXT naturally when relevant and if user mentions organizations
+- Use appropriate emojis for the culture and language
+- For negative feedback: acknowledge, apologize if needed, direct to inbox
+- For positive feedback: thank warmly and show appreciation
+- For questions: answer briefly or direct to contact information
+- MAINTAIN THE SAME LEVEL OF FORMALITY as the user's comment
+
+CULTURAL SENSITIVITY:
+- Use culturally appropriate greetings and expressions
+- Respect local customs and communication styles
+- Use formal/informal tone as appropriate for the language AND user's style
+
+EXAMPLES:
+- If comment is in English: "<name>, thank you for your comment! 😊"
+- If comment is in Bengali: "<name>, আপনার মন্তব্যের জন্য ধন্যবাদ! 😊"
+- If comment is in Hindi: "<name>, आपकी टिप्पणी के लिए धन्यवाद! 😊"
+"""
+
+# --- Reply caching ---
+REPLY_CACHE_SIZE = int(os.getenv("REPLY_CACHE_SIZE", "10000"))
+REPLY_CACHE_TTL_SECONDS = int(os.getenv("REPLY_CACHE_TTL_SECONDS", "3600"))
+# 1 answers greeting-only comments ("hi", "assalamu alaikum!") with a canned greeting in their
+# language, without building a prompt or calling the LLM (0 sends them to the LLM like any comment)
+CANNED_GREETING_REPLIES = int(os.getenv("CANNED_GREETING_REPLIES", "1"))
+CANNED_GREETING_REPLY_TEMPLATES = {
+    "salam": "{name}, ওয়ালাইকুম আসসালাম! 😊",
+    "salam_latin": "{name}, Walaikum Assalam! 😊",
+    "bangla": "{name}, আপনাকেও শুভেচ্ছা! 😊",
+    "english": "{name}, hello! Thanks for stopping by 😊",
+    "hindi": "{name}, नमस्ते! 😊",
+    "arabic": "{name}, أهلاً وسهلاً! 😊",
+    "chinese": "{name}, 你好! 😊",
+    "japanese": "{name}, こんにちは! 😊",
+}
+# With canned replies off, 1 shares cached LLM replies to greeting-only comments across a page's
+# posts; their prompts then leave out the post context and recent comments (0 keeps them per post)
+GREETING_REPLIES_PAGE_WIDE = int(os.getenv("GREETING_REPLIES_PAGE_WIDE", "0"))
+GREETING_REPLY_SCOPE = "*greetings*"  # stands in for the post id in page-wide greeting cache keys
+PROMPT_FRAGMENT_CACHE_SIZE = int(os.getenv("PROMPT_FRAGMENT_CACHE_SIZE", "5000"))
+PAGE_OVERLAY_CACHE_SIZE = int(os.getenv("PAGE_OVERLAY_CACHE_SIZE", "2000"))
+# Memo of slang/language/sentiment/name analysis results for recurring short comments ("nice",
+# "price?", "👍"), split evenly between the four analyses
+ANALYSIS_MEMO_MAX_BYTES = int(os.getenv("ANALYSIS_MEMO_MAX_BYTES", str(32 * 1024 * 1024)))
+ANALYSIS_MEMO_MAX_TEXT_LENGTH = int(os.getenv("ANALYSIS_MEMO_MAX_TEXT_LENGTH", "500"))  # longer comments rarely repeat
+MEMO_MISS = object()  # LRUCache.get() default, since None is a valid memoized result
+
+
+def approximate_entry_size(key, value):
+    """Rough memory held by a cache entry: its key and value reprs plus fixed per-entry overhead."""
+    return 200 + len(repr(key)) + len(repr(value))
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with a per-entry time to live and hit/miss counters.
+    Entries past their TTL count as misses and are dropped on lookup.
+    With max_bytes, entries are also evicted to keep their approximate_entry_size() total under it.
+    """
+
+    def __init__(self, max_entries, ttl=None, max_bytes=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (expires_at, value, size), least recently used first
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > time.time()):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self.entries[key]
+                self.total_bytes -= entry[2]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        expires_at = time.time() + self.ttl if self.ttl else None
+        size = approximate_entry_size(key, value) if self.max_bytes else 0
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= previous[2]
+            self.entries[key] = (expires_at, value, size)
+            self.total_bytes += size
+            while self.entries and (len(self.entries) > self.max_entries or
+                                    (self.max_bytes and self.total_bytes > self.max_bytes)):
+                _, evicted = self.entries.popitem(last=False)
+                self.total_bytes -= evicted[2]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def get_stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+            if self.max_bytes:
+                stats.update(approximate_bytes=self.total_bytes, max_bytes=self.max_bytes)
+            return stats
+
+
+# --- Near-duplicate reply reuse ---
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.8"))
+# Comments of at most NEAR_DUP_SHORT_WORDS words need the stricter threshold: one changed word is a big share of them
+NEAR_DUP_SHORT_WORDS = int(os.getenv("NEAR_DUP_SHORT_WORDS", "3"))
+NEAR_DUP_SHORT_THRESHOLD = float(os.getenv("NEAR_DUP_SHORT_THRESHOLD", "0.9"))
+NEAR_DUP_MAX_PER_POST = int(os.getenv("NEAR_DUP_MAX_PER_POST", "50000"))
+NEAR_DUP_MAX_POSTS = int(os.getenv("NEAR_DUP_MAX_POSTS", "1000"))
+NEAR_DUP_AUDIT_RATE = float(os.getenv("NEAR_DUP_AUDIT_RATE", "0.05"))
+NEAR_DUP_MAX_BYTES = int(os.getenv("NEAR_DUP_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Words that change what a reply must say. Two comments whose words differ by one of these (or by
+# a number) never share a reply, however similar they are: "product is not good" vs "product is good".
+NEAR_DUP_NEGATORS = frozenset({
+    "not", "no", "never", "none", "nothing", "na", "nai", "nah", "nahi", "nahin", "nei",
+    "না", "নাই", "নেই", "নয়", "নি", "নেহি", "नहीं", "ना", "मत"
+})
+NEAR_DUP_SIZE_WORDS = frozenset({
+    "xxs", "xs", "s", "m", "l", "xl", "xxl", "xxxl", "small", "medium", "large", "free"
+})
+NEAR_DUPLICATE_REGRESSIONS = [
+    # (answered comment, new comment) pairs that must not share a reply
+    ("product is good", "product is not good"),
+    ("delivery valo", "delivery valo na"),
+    ("cash on delivery available", "cash on delivery not available"),
+    ("xl size ache", "xxl size ache"),
+    ("stock ache", "stock nai"),
+    ("2 ta nibo", "3 ta nibo"),
+    ("ডেলিভারি হবে", "ডেলিভারি হবে না"),
+]
+
+MINHASH_BANDS = 8
+MINHASH_ROWS = 4
+# Each "permutation" XORs the 64-bit shingle hash with a random mask; cheap enough that a
+# signature costs a few dozen C-level min() calls instead of big-integer arithmetic
+_minhash_random = random.Random(1117)
+MINHASH_MASKS = [_minhash_random.getrandbits(64) for _ in range(MINHASH_BANDS * MINHASH_ROWS)]
+
+
+def comment_shingles(normalized_text, n=3):
+    """
+    Character n-grams taken inside each word (padded with spaces), so word order doesn't
+    matter: "dam koto" and "koto dam" produce the same set.
+    """
+    shingles = set()
+    for token in normalized_text.split():
+        padded = f" {token} "
+        if len(padded) <= n:
+            shingles.add(padded)
+        else:
+            shingles.update(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return frozenset(shingles)
+
+
+def comment_words(normalized_text):
+    """The words of a comment with edge punctuation trimmed, for comparing two near duplicates."""
+    return frozenset(word.strip("?!.,;:।'\"") for word in normalized_text.split())
+
+
+def changes_meaning(words, other_words):
+    """
+    True if the words one comment has and the other lacks include a negator, a size or a number,
+    so a reply to one may say the opposite of what the other needs.
+    """
+    for word in words ^ other_words:
+        if word in NEAR_DUP_NEGATORS or word in NEAR_DUP_SIZE_WORDS or word.endswith("n't"):
+            return True
+        if any(char.isdigit() for char in word):
+            return True
+    return False
+
+
+def minhash_band_keys(shingles):
+    """MinHash signature of a shingle set, split into LSH band keys."""
+    hashes = [hash(shingle) & 0xFFFFFFFFFFFFFFFF for shingle in shingles]
+    signature = [min(map(mask.__xor__, hashes)) for mask in MINHASH_MASKS]
+    return [(band, tuple(signature[band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS]))
+            for band in range(MINHASH_BANDS)]
+
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index of the comments already answered on one post. Comments sharing any
+    band are candidates; a candidate is reused only if the exact Jaccard similarity of the
+    shingle sets reaches the threshold and the two comments don't differ by a word that changes
+    their meaning (changes_meaning()). Entries expire like reply cache entries, and the
+    oldest are evicted beyond max_entries. total_bytes tracks their approximate size.
+    """
+
+    max_candidates = 32
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # entry id -> (expires_at, shingles, band keys, text, value, size), oldest first
+        self.buckets = {}  # band key -> list of entry ids
+        self.next_id = 0
+        self.total_bytes = 0
+
+    def lookup(self, shingles, words, threshold, now):
+        """
+        Returns (similarity, text, value) for the first live candidate at or above threshold
+        whose words don't change the meaning, or None.
+        At most max_candidates are verified, which keeps crowded buckets from slowing lookups down.
+        """
+        seen = set()
+        for band_key in minhash_band_keys(shingles):
+            for entry_id in self.buckets.get(band_key, ()):
+                if entry_id in seen:
+                    continue
+                seen.add(entry_id)
+                expires_at, entry_shingles, _, text, value, _ = self.entries[entry_id]
+                if expires_at is not None and expires_at <= now:
+                    continue
+                similarity = len(shingles & entry_shingles) / len(shingles | entry_shingles)
+                if similarity >= threshold and not changes_meaning(words, comment_words(text)):
+                    return similarity, text, value
+                if len(seen) >= self.max_candidates:
+                    return None
+        return None
+
+    def add(self, shingles, text, value, expires_at):
+        """Indexes a comment. Returns the change in total_bytes, evictions included."""
+        before = self.total_bytes
+        band_keys = minhash_band_keys(shingles)
+        size = approximate_entry_size(text, value) + 80 * (len(shingles) + len(band_keys))
+        entry_id = self.next_id
+        self.next_id += 1
+        self.entries[entry_id] = (expires_at, shingles, band_keys, text, value, size)
+        self.total_bytes += size
+        for band_key in band_keys:
+            self.buckets.setdefault(band_key, []).append(entry_id)
+
+        while len(self.entries) > self.max_entries:
+            self.evict_oldest()
+        return self.total_bytes - before
+
+    def evict_oldest(self):
+        """Drops the oldest entry and returns its size."""
+        old_id, (_, _, old_band_keys, _, _, size) = self.entries.popitem(last=False)
+        for band_key in old_band_keys:
+            bucket = self.buckets[band_key]
+            bucket.remove(old_id)
+            if not bucket:
+                del self.buckets[band_key]
+        self.total_bytes -= size
+        return size
+
+    def purge_expired(self, now):
+        """Drops expired entries (all entries share one TTL, so they are the oldest). Returns the bytes freed."""
+        freed = 0
+        while self.entries:
+            expires_at = next(iter(self.entries.values()))[0]
+            if expires_at is None or expires_at > now:
+                break
+            freed += self.evict_oldest()
+        return freed
+
+
+class NearDuplicateCache:
+    """
+    Per-post NearDuplicateIndex instances (least recently used posts evicted), with hit-rate
+    counters and a sample of reused pairs kept for spotting false reuse. Comments of at most
+    short_words words must reach short_threshold instead of threshold. Entries live for `ttl`
+    seconds, and with max_bytes the oldest entries of the least recently used posts are evicted
+    to keep the approximate total under it.
+    """
+
+    def __init__(self, threshold, max_per_post, max_posts, audit_rate, ttl=None, max_bytes=None,
+                 short_words=NEAR_DUP_SHORT_WORDS, short_threshold=NEAR_DUP_SHORT_THRESHOLD):
+        self.threshold = threshold
+        self.short_words = short_words
+        self.short_threshold = short_threshold
+        self.max_per_post = max_per_post
+        self.max_posts = max_posts
+        self.audit_rate = audit_rate
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.indexes = OrderedDict()  # scope -> NearDuplicateIndex, least recently used first
+        self.total_bytes = 0
+        self.lookups = 0
+        self.hits = 0
+        self.audit_samples = deque(maxlen=200)
+
+    def get_index(self, scope, now):
+        """The scope's index with expired entries purged (None if it has no live entries). Call with lock held."""
+        index = self.indexes.get(scope)
+        if index is None:
+            return None
+        self.indexes.move_to_end(scope)
+        self.total_bytes -= index.purge_expired(now)
+        if not index.entries:
+            del self.indexes[scope]
+            return None
+        return index
+
+    def lookup(self, scope, normalized_text):
+        shingles = comment_shingles(normalized_text)
+        if len(shingles) < 2:
+            return None
+        words = comment_words(normalized_text)
+        threshold = self.threshold
+        if len(words) <= self.short_words:
+            threshold = max(threshold, self.short_threshold)
+        now = time.time()
+        with self.lock:
+            self.lookups += 1
+            index = self.get_index(scope, now)
+            match = index.lookup(shingles, words, threshold, now) if index else None
+            if match is None:
+                return None
+            self.hits += 1
+            similarity, matched_text, value = match
+            if random.random() < self.audit_rate:
+                self.audit_samples.append({
+                    "comment": normalized_text,
+                    "matched_comment": matched_text,
+                    "similarity": round(similarity, 3),
+                    "scope": list(scope)
+                })
+            return similarity, value
+
+    def add(self, scope, normalized_text, value):
+        shingles = comment_shingles(normalized_text)
+        if len(shingles) < 2:
+            return
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl else None
+        with self.lock:
+            index = self.get_index(scope, now)
+            if index is None:
+                index = NearDuplicateIndex(self.max_per_post)
+                self.indexes[scope] = index
+            self.total_bytes += index.add(shingles, normalized_text, value, expires_at)
+
+            while len(self.indexes) > self.max_posts:
+                _, evicted = self.indexes.popitem(last=False)
+                self.total_bytes -= evicted.total_bytes
+            while self.max_bytes and self.total_bytes > self.max_bytes and self.indexes:
+                oldest_scope, oldest = next(iter(self.indexes.items()))
+                self.total_bytes -= oldest.evict_oldest()
+                if not oldest.entries:
+                    del self.indexes[oldest_scope]
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "threshold": self.threshold,
+                "short_threshold": self.short_threshold,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else 0.0,
+                "posts_indexed": len(self.indexes),
+                "approximate_bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "audit_samples": list(self.audit_samples)
+            }
+
+
+def find_near_duplicate_regressions(threshold=NEAR_DUP_THRESHOLD):
+    """The NEAR_DUPLICATE_REGRESSIONS pairs that would share a reply (empty when reuse is safe)."""
+    reused = []
+    for answered, comment in NEAR_DUPLICATE_REGRESSIONS:
+        cache = NearDuplicateCache(threshold, max_per_post=1, max_posts=1, audit_rate=0)
+        cache.add("regression", answered, answered)
+        if cache.lookup("regression", comment) is not None:
+            reused.append((answered, comment))
+    return reused
+
+
+# --- Duplicate delivery coalescing ---
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "300"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "50000"))
+# How long a duplicate delivery waits for the leader before generating its own reply
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "30"))
+
+
+class ReplyCoalescer:
+    """
+    Single-flight coalescing of replies by comment. Facebook and our own retries deliver the
+    same comment_id several times within seconds: the first delivery computes the reply,
+    concurrent duplicates wait on it, and late duplicates get the stored reply for `ttl` seconds.
+    If the leader is cancelled, waiting duplicates get None and generate their own reply.
+    """
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.recent = OrderedDict()  # key -> (expires_at, response), oldest first
+        self.stats = {"leaders": 0, "coalesced": 0, "idempotent_hits": 0, "abandoned": 0}
+
+    def begin(self, key):
+        """
+        Returns (future, is_leader). The leader must compute the response and call finish() (or
+        abandon() if it never gets one); everyone else gets a Future that resolves to a copy of
+        the leader's response, or to None if the leader was abandoned.
+        """
+        with self.lock:
+            cached = self.recent.get(key)
+            if cached is not None:
+                if cached[0] > time.time():
+                    self.stats["idempotent_hits"] += 1
+                    future = Future()
+                    future.set_result(self.duplicate_response(cached[1]))
+                    return future, False
+                del self.recent[key]
+
+            leader_future = self.in_flight.get(key)
+            if leader_future is None:
+                self.stats["leaders"] += 1
+                leader_future = Future()
+                self.in_flight[key] = leader_future
+                return leader_future, True
+            self.stats["coalesced"] += 1
+
+        future = Future()
+
+        def forward(done):
+            try:
+                if done.exception() is not None:
+                    future.set_exception(done.exception())
+                elif done.result() is None:
+                    future.set_result(None)
+                else:
+                    future.set_result(self.duplicate_response(done.result()))
+            except InvalidStateError:
+                pass  # The duplicate was cancelled (e.g. its stream consumer went away)
+
+        leader_future.add_done_callback(forward)
+        return future, False
+
+    def finish(self, key, leader_future, response=None, exception=None):
+        """Publishes the leader's response (or exception) to waiting duplicates and caches it."""
+        with self.lock:
+            self.in_flight.pop(key, None)
+            if exception is None and "error" not in response:
+                self.recent[key] = (time.time() + self.ttl, dict(response))
+                self.recent.move_to_end(key)
+                while len(self.recent) > self.max_entries:
+                    self.recent.popitem(last=False)
+        if exception is not None:
+            leader_future.set_exception(exception)
+        else:
+            leader_future.set_result(response)
+
+    def abandon(self, key, leader_future):
+        """Releases the key of a leader that was cancelled or interrupted before finishing."""
+        with self.lock:
+            self.in_flight.pop(key, None)
+            self.stats["abandoned"] += 1
+        leader_future.set_result(None)
+
+    def duplicate_response(self, response):
+        """Copy of a stored response, flagged so callers know no new reply was generated."""
+        duplicate = dict(response)
+        duplicate["deduplicated"] = True
+        return duplicate
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, in_flight=len(self.in_flight), cached=len(self.recent))
+
+
+# --- Text normalization ---
+# Same mapping the old chain of str.replace calls applied, as one precomputed translate table
+SLANG_SYMBOL_TABLE = str.maketrans({
+    '@': 'a', '3': 'e', '1': 'i', '0': 'o', '5': 's',
+    '$': 's', '7': 't', '4': 'a', '!': 'i', '*': '',
+    '#': '', '%': '', '&': '', '+': '', '=': '',
+    '_': ' ', '-': ' ',  # Replace hyphens and underscores with spaces to catch spaced-out slang
+    '.': ' ', ',': ' ', ';': ' ', ':': ' ',  # Replace punctuation with spaces
+    '(': ' ', ')': ' ', '[': ' ', ']': ' ', '{': ' ', '}': ' ',
+    '<': ' ', '>': ' ', '/': ' ', '\\': ' ', '|': ' '
+})
+# One pass that collapses whitespace runs to a single space and 3+ repeats of a character to two
+WHITESPACE_OR_REPEAT_RE = re.compile(r'(\s+)|(.)\2{2,}')
+
+
+def collapse_whitespace_or_repeat(match):
+    return ' ' if match.group(1) else match.group(2) * 2
+
+
+def clean_text_for_slang(text):
+    """
+    Lowercases text, maps symbols to letters or spaces, collapses whitespace and reduces more
+    than two repetitions of any character (e.g., 'fukkkk' -> 'fukk') for slang detection.
+    """
+    text = text.lower().translate(SLANG_SYMBOL_TABLE)
+    return WHITESPACE_OR_REPEAT_RE.sub(collapse_whitespace_or_repeat, text).strip()
+
+
+def normalize_comment(text):
+    """
+    Normalizes a comment once for all local analysis: "lower" is used by the language, sentiment
+    and name-pattern checks, "cleaned" (see clean_text_for_slang) by slang detection.
+    """
+    lower = text.lower()
+    return {
+        "text": text,
+        "lower": lower,
+        "cleaned": WHITESPACE_OR_REPEAT_RE.sub(collapse_whitespace_or_repeat,
+                                               lower.translate(SLANG_SYMBOL_TABLE)).strip()
+    }
+
+
+# --- Bengali normalization and Banglish transliteration (moderation only) ---
+# Characters abusers insert to split a word without changing how it looks
+INVISIBLE_CHARS_TABLE = str.maketrans({
+    "\u200b": None, "\u200c": None, "\u200d": None,  # zero-width space, ZWNJ, ZWJ
+    "\u2060": None, "\ufeff": None, "\u00ad": None  # word joiner, BOM, soft hyphen
+})
+# Spelling variants folded together before matching: long/short vowels, nukta (য়/ড়/ঢ় become
+# য/ড/ঢ after NFC decomposes them), chandrabindu and khanda ta
+BENGALI_CANONICAL_TABLE = str.maketrans({
+    "ী": "ি", "ূ": "ু", "ঈ": "ই", "ঊ": "উ",
+    "\u09bc": None, "\u0981": None, "ৎ": "ত"
+})
+
+
+def normalize_bengali(text):
+    """Strips invisible joiners, applies NFC and folds Bengali spelling variants (see above)."""
+    if text.isascii():
+        return text
+    text = unicodedata.normalize("NFC", text.translate(INVISIBLE_CHARS_TABLE))
+    return text.translate(BENGALI_CANONICAL_TABLE)
+
+
+# Romanized Bengali -> Bengali script, longest rule first. Consonants are written without hasant
+# (as in খানকির, মাদারচোদ) except for doubled letters, which become conjuncts (baccha -> বাচ্চা).
+BANGLISH_CONSONANTS = {
+    "cch": "চ্চ", "chh": "ছ", "kkh": "ক্ষ",
+    "kh": "খ", "gh": "ঘ", "ng": "ং", "ch": "চ", "jh": "ঝ", "th": "থ", "dh": "ধ", "ph": "ফ",
+    "bh": "ভ", "sh": "শ", "rh": "ঢ়", "cc": "চ্চ", "kk": "ক্ক", "tt": "ত্ত", "dd": "দ্দ", "ll": "ল্ল",
+    "nn": "ন্ন", "mm": "ম্ম", "pp": "প্প", "ss": "স্স", "bb": "ব্ব", "gg": "গ্গ",
+    "k": "ক", "g": "গ", "c": "চ", "j": "জ", "t": "ত", "d": "দ", "n": "ন", "p": "প", "f": "ফ",
+    "b": "ব", "v": "ভ", "m": "ম", "r": "র", "l": "ল", "s": "স", "h": "হ", "y": "য়", "z": "জ",
+    "q": "ক", "x": "ক্স", "w": "ও"
+}
+BANGLISH_VOWEL_SIGNS = {"ee": "ী", "oo": "ু", "oi": "ৈ", "ou": "ৌ", "a": "া", "i": "ি", "u": "ু", "e": "ে", "o": "ো"}
+BANGLISH_INITIAL_VOWELS = {"ee": "ঈ", "oo": "উ", "oi": "ঐ", "ou": "ঔ", "a": "আ", "i": "ই", "u": "উ", "e": "এ", "o": "ও"}
+
+
+@functools.lru_cache(maxsize=50000)
+def transliterate_banglish_token(token):
+    """Transliterates one lowercase romanized token into Bengali script (cached)."""
+    output = []
+    index = 0
+    after_consonant = False
+    while index < len(token):
+        for length in (3, 2, 1):
+            chunk = token[index:index + length]
+            if len(chunk) < length:
+                continue
+            if chunk in BANGLISH_CONSONANTS:
+                output.append(BANGLISH_CONSONANTS[chunk])
+                after_consonant = True
+                break
+            vowels = BANGLISH_VOWEL_SIGNS if after_consonant else BANGLISH_INITIAL_VOWELS
+            if chunk in vowels:
+                output.append(vowels[chunk])
+                after_consonant = False
+                break
+        else:
+            chunk = token[index]
+            output.append(chunk)
+            after_consonant = False
+        index += len(chunk)
+    return normalize_bengali("".join(output))
+
+
+def transliterate_banglish(text):
+    """Transliterates the romanized (ASCII letter) tokens of text; other tokens pass through."""
+    return " ".join(transliterate_banglish_token(token) if token.isascii() and token.isalpha() else token
+                    for token in text.split())
+
+
+# --- Slang matching ---
+def is_word_char(char):
+    """
+    Word character for slang word boundaries: what regex \\w matches (letters, digits, underscore)
+    plus combining marks, so Bengali vowel signs such as 'ি' in "মাগি" count as part of the word.
+    """
+    return char.isalnum() or char == "_" or unicodedata.category(char) in ("Mn", "Mc")
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton over a fixed set of strings. iter_matches() reports every occurrence
+    of every key in one left-to-right pass, however many keys there are.
+
+    The automaton is compiled to flat int arrays: a dense transition table with the failure
+    links folded in (one row per state, one column per character class; characters that appear
+    in no key share class 0), and the ids of the keys ending at each state. A transition holds
+    the target row's offset, bit-inverted (negative) when keys end there, so matching costs one
+    dict lookup and one array read per character. Flat arrays can be used straight from a
+    memory-mapped lexicon artifact (see read_lexicon_artifact()).
+    """
+
+    def __init__(self, keys):
+        goto = [{}]
+        output = [()]
+        for key in sorted(set(keys)):  # sorted, so the same keys always give the same arrays
+            if not key:
+                continue
+            state = 0
+            for char in key:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    output.append(())
+                state = next_state
+            if key not in output[state]:
+                output[state] = output[state] + (key,)
+
+        self.keys = sorted({key for keys_ in output for key in keys_})
+        self.classes = {char: index + 1 for index, char in enumerate(sorted({char for edges in goto for char in edges}))}
+        self.width = len(self.classes) + 1
+
+        # Breadth-first pass: each state's row starts as a copy of its failure state's row
+        fail = [0] * len(goto)
+        rows = [None] * len(goto)
+        rows[0] = [0] * self.width
+        for char, child in goto[0].items():
+            rows[0][self.classes[char]] = child
+        queue_ = deque(goto[0].values())
+        while queue_:
+            state = queue_.popleft()
+            fallback_row = rows[fail[state]]
+            row = list(fallback_row)
+            for char, child in goto[state].items():
+                column = self.classes[char]
+                row[column] = child
+                fail[child] = fallback_row[column]
+                output[child] = output[child] + output[fail[child]]
+                queue_.append(child)
+            rows[state] = row
+
+        key_ids = {key: index for index, key in enumerate(self.keys)}
+        self.delta = array.array("i", [~(target * self.width) if output[target] else target * self.width
+                                       for row in rows for target in row])
+        self.output_offsets = array.array("i", [0])
+        self.output_keys = array.array("i")
+        for keys_ in output:
+            self.output_keys.extend(key_ids[key] for key in keys_)
+            self.output_offsets.append(len(self.output_keys))
+
+    def to_compiled(self):
+        """JSON-compatible data plus the flat arrays (copied, in case they are views of a mapped file)."""
+        return {"keys": self.keys, "classes": self.classes, "width": self.width,
+                "delta": array.array("i", self.delta), "output_offsets": array.array("i", self.output_offsets),
+                "output_keys": array.array("i", self.output_keys)}
+
+    @classmethod
+    def from_compiled(cls, compiled):
+        automaton = cls.__new__(cls)
+        for name in ("keys", "classes", "width", "delta", "output_offsets", "output_keys"):
+            setattr(automaton, name, compiled[name])
+        return automaton
+
+    def iter_matches(self, text):
+        """Yields (start, end, key) for every occurrence of a key in text."""
+        delta, width, classes = self.delta, self.width, self.classes
+        output_offsets, output_keys, keys = self.output_offsets, self.output_keys, self.keys
+        row = 0
+        for index, char in enumerate(text):
+            row = delta[row + classes.get(char, 0)]
+            if row < 0:
+                row = ~row
+                state = row // width
+                first, last = output_offsets[state], output_offsets[state + 1]
+                end = index + 1
+                for position in range(first, last):
+                    key = keys[output_keys[position]]
+                    yield end - len(key), end, key
+
+
+# Word boundaries for slang_patterns: like \\b, but the whole Bengali block (including vowel
+# signs) counts as part of a word
+PATTERN_WORD_START = r'(?<![\w\u0980-\u09FF])'
+PATTERN_WORD_END = r'(?![\w\u0980-\u09FF])'
+
+# Fuzzy slang matching: 0 (the default) disables it, 1 or 2 is the largest edit distance allowed.
+# Check the false positive rate of `python benchmarks.py fuzzy --comments <page export>` first.
+SLANG_FUZZY_MAX_DISTANCE = int(os.getenv("SLANG_FUZZY_MAX_DISTANCE", "0"))
+ASCII_WORD_RE = re.compile(r'[a-z]+')
+REPEATED_CHAR_RE = re.compile(r'(.)\1+')
+
+
+def edit_distance(a, b, limit):
+    """
+    Optimal string alignment distance (insert, delete, substitute, swap adjacent letters)
+    between a and b, or limit + 1 as soon as it is known to exceed limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def is_adjacent_swap(a, b):
+    """True if b is a with exactly two neighbouring letters swapped ("fcuk" / "fuck")."""
+    if len(a) != len(b) or a == b:
+        return False
+    diffs = [i for i in range(len(a)) if a[i] != b[i]]
+    return len(diffs) == 2 and diffs[1] == diffs[0] + 1 and a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]]
+
+
+class FuzzyLexicon:
+    """
+    SymSpell-style deletion index over the romanized/English slang words, for misspellings
+    such as "fcuk" or "bicth". Every word is stored under each string obtained by deleting up to
+    its allowed number of letters; a token looks up its own deletions, so a lookup costs a few
+    dict probes whatever the lexicon size, and only the candidates found are checked with
+    edit_distance().
+
+    How far a word may drift depends on its length, as short words have many innocent
+    neighbours ("fuck" / "luck"): under 4 letters never, 4 letters only by swapping two adjacent
+    letters, 5-7 letters by one edit, longer words by two. The first letter must always match.
+    The index always covers those distances, so a lookup may allow more than max_distance.
+    A plain inflection of a lexicon word ("sluts", "bitches", "fuckers") is that word, whatever
+    its length; it is never taken for a misspelling of a different entry ("fucked" / "fucker").
+    """
+
+    inflection_suffixes = ("s", "es", "ed", "ing", "er", "ers")
+
+    def __init__(self, words, max_distance):
+        self.max_distance = max_distance
+        self.words = set(words)
+        self.deletes = {}
+        for word in words:
+            for variant in self.deletion_variants(word, self.length_distance(word)):
+                self.deletes.setdefault(variant, set()).add(word)
+
+    def to_compiled(self):
+        return {"max_distance": self.max_distance, "words": sorted(self.words),
+                "deletes": {variant: sorted(words) for variant, words in sorted(self.deletes.items())}}
+
+    @classmethod
+    def from_compiled(cls, compiled):
+        lexicon = cls.__new__(cls)
+        lexicon.max_distance = compiled["max_distance"]
+        lexicon.words = set(compiled["words"])
+        lexicon.deletes = {variant: set(words) for variant, words in compiled["deletes"].items()}
+        return lexicon
+
+    @staticmethod
+    def length_distance(word):
+        if len(word) < 4:
+            return 0
+        if len(word) < 8:
+            return 1
+        return 2
+
+    @staticmethod
+    def deletion_variants(word, distance):
+        variants = {word}
+        frontier = {word}
+        for _ in range(distance):
+            frontier = {variant[:i] + variant[i + 1:] for variant in frontier for i in range(len(variant))}
+            variants |= frontier
+        return variants
+
+    def inflection_bases(self, token):
+        """Lexicon words token is an inflection of."""
+        return {token[:-len(suffix)] for suffix in self.inflection_suffixes
+                if token.endswith(suffix) and token[:-len(suffix)] in self.words}
+
+    def lookup(self, token, max_distance=None):
+        """Returns the lexicon word token is a misspelling of, or None."""
+        max_distance = self.max_distance if max_distance is None else max_distance
+        if max_distance <= 0 or len(token) < 3:
+            return None
+        bases = self.inflection_bases(token)
+        if bases:
+            return max(bases, key=len)
+        candidates = set()
+        for variant in self.deletion_variants(token, min(2, max_distance)):
+            candidates |= self.deletes.get(variant, set())
+        for word in sorted(candidates, key=len, reverse=True):
+            allowed = min(self.length_distance(word), max_distance)
+            if word[0] != token[0] or not allowed:
+                continue
+            if len(word) == 4:
+                if is_adjacent_swap(word, token):
+                    return word
+            elif edit_distance(word, token, allowed) <= allowed:
+                return word
+        return None
+
+
+class GreetingMatcher:
+    """
+    Greeting detection with two compiled regexes over the lowercased comment, instead of
+    testing every greeting in turn. A comment counts as a greeting when one starts it (followed
+    by a space, ',' or '!' or nothing) or appears after a space (followed by a space or nothing);
+    it is greeting-only when it is nothing but greetings, punctuation and emoji.
+    """
+
+    def __init__(self, greetings):
+        alternatives = "|".join(re.escape(greeting) for greeting in sorted(set(greetings), key=len, reverse=True))
+        if not alternatives:
+            alternatives = "(?!)"  # no greetings: never matches
+        self.greeting_regex = re.compile(
+            rf"^(?P<leading>{alternatives})(?=[ ,!]|$)|(?<= )(?P<inner>{alternatives})(?= |$)")
+        self.greeting_only_regex = re.compile(rf"[\W_]*(?:{alternatives})(?:[\W_]+(?:{alternatives}))*[\W_]*")
+
+    def classify(self, original_lower):
+        """Returns {"greeting": the greeting found, "greeting_only": bool}, or None if there is none."""
+        match = self.greeting_regex.search(original_lower)
+        if match is None:
+            return None
+        return {
+            "greeting": match.group("leading") or match.group("inner"),
+            "greeting_only": self.greeting_only_regex.fullmatch(original_lower) is not None
+        }
+
+
+# --- Locating matches in the original comment ---
+# Matching runs on normalized text (leetspeak decoded, punctuation and repeats collapsed, Bengali
+# variants folded), so a match is mapped back by searching the comment for any spelling that
+# normalizes to the matched text. Only the reported match is located, never every candidate.
+SLANG_SYMBOL_SOURCES = {}
+for _symbol, _replacement in SLANG_SYMBOL_TABLE.items():
+    if _replacement:
+        SLANG_SYMBOL_SOURCES.setdefault(_replacement, []).append(chr(_symbol))
+for _variant, _canonical in BENGALI_CANONICAL_TABLE.items():
+    if _canonical:
+        SLANG_SYMBOL_SOURCES.setdefault(_canonical, []).append(chr(_variant))
+for _precomposed, _base in (("\u09dc", "ড"), ("\u09dd", "ঢ"), ("\u09df", "য")):  # ড় ঢ় য় before NFC
+    SLANG_SYMBOL_SOURCES.setdefault(_base, []).append(_precomposed)
+# Characters normalization deletes: symbols, invisible joiners, nukta, chandrabindu
+IGNORABLE_CHARS_CLASS = "[" + re.escape("".join(
+    [chr(symbol) for symbol, replacement in SLANG_SYMBOL_TABLE.items() if replacement == ""] +
+    [chr(char) for char in INVISIBLE_CHARS_TABLE] +
+    [chr(char) for char, replacement in BENGALI_CANONICAL_TABLE.items() if replacement is None])) + "]*"
+
+
+@functools.lru_cache(maxsize=4096)
+def original_spelling_regex(normalized):
+    """Regex matching the spellings of a comment that normalize to `normalized`."""
+    parts = []
+    for char in normalized:
+        if char == " ":
+            parts.append(r"[\W_]*")
+            continue
+        sources = [char] + SLANG_SYMBOL_SOURCES.get(char, [])
+        parts.append("[" + re.escape("".join(sources)) + "]+" + IGNORABLE_CHARS_CLASS)
+    return re.compile("".join(parts), re.IGNORECASE)
+
+
+def locate_in_comment(comment, normalized, occurrence=0):
+    """Span [start, end] of the given occurrence of `normalized` in comment (or the last one found), or None."""
+    span = None
+    for index, match in enumerate(original_spelling_regex(normalized).finditer(comment)):
+        span = list(match.span())
+        if index == occurrence:
+            break
+    return span
+
+
+class SlangMatcher:
+    """
+    Compiled slang lexicon. Offensive words, phrases, combination parts and the false-positive
+    allowlist all go into one Aho-Corasick automaton; word boundaries and allowlist checks are
+    applied to the matches it reports. The slang_patterns become one alternation of named
+    groups, so every pattern is tried in a single regex search.
+
+    Lexicon and comments both go through normalize_bengali(), and romanized tokens are also
+    matched in their Bengali transliteration. Romanized entries whose transliteration is already
+    in the lexicon are therefore left out of the automaton. Only Bengali entries with a romanized
+    counterpart count in the transliteration: the lexicon leaves some romanized forms out on
+    purpose, and slang_patterns are only tried on the comment itself.
+
+    When nothing matches exactly, ASCII tokens are looked up in a FuzzyLexicon of the English
+    and romanized words. Bengali script is not fuzzy-matched: its obfuscations are handled by
+    normalize_bengali(), and a one-letter edit there often gives a real word (হারামি / হারাম).
+    Tokens in the false-positive allowlist or in fuzzy_allowlist are never fuzzy-matched.
+    """
+
+    # Joins the cleaned, original and transliterated text so all are scanned in a single pass.
+    # It is not a word character and appears in no key, so matches never span it.
+    separator = "\x00"
+
+    def __init__(self, truly_offensive_words, false_positives, offensive_combinations, slang_patterns=(),
+                 fuzzy_allowlist=(), fuzzy_max_distance=SLANG_FUZZY_MAX_DISTANCE, greetings=()):
+        # Greetings travel with the matcher, so a lexicon reload swaps both at once
+        self.greetings = [greeting.lower() for greeting in greetings]
+        self.greeting_matcher = GreetingMatcher(self.greetings)
+        self.phrases = set()  # multi-word entries: plain substring match
+        self.words = set()  # single words: whole-word match
+        self.false_positives = {word.lower(): [fp.lower() for fp in fps] for word, fps in false_positives.items()}
+        entries = {normalize_bengali(word.lower()) for word in truly_offensive_words}
+        self.covered_by_transliteration = {
+            word for word in entries
+            if word.isascii() and word not in self.false_positives and transliterate_banglish(word) in entries
+        }
+        for word in entries - self.covered_by_transliteration:
+            (self.phrases if " " in word else self.words).add(word)
+
+        combinations = [tuple(normalize_bengali(part.lower()) for part in combo) for combo in offensive_combinations]
+        self.combinations = [
+            combo for combo in dict.fromkeys(combinations)
+            if not (all(part.isascii() for part in combo) and
+                    tuple(transliterate_banglish(part) for part in combo) in combinations)
+        ]
+        self.covered_by_transliteration.update(" + ".join(combo) for combo in combinations
+                                               if combo not in self.combinations)
+        self.combination_parts = {part for combo in self.combinations for part in combo}
+        # Keys that may match in the transliteration segment
+        self.transliterated_entries = (
+            {transliterate_banglish(word) for word in entries if word.isascii()} |
+            {transliterate_banglish(part) for combo in combinations for part in combo if part.isascii()})
+        self.allowlist = {fp for fps in self.false_positives.values() for fp in fps}
+
+        self.automaton = AhoCorasick(self.phrases | self.words | self.combination_parts | self.allowlist)
+
+        self.fuzzy_allowlist = self.allowlist | {word.lower() for word in fuzzy_allowlist}
+        self.fuzzy_lexicon = FuzzyLexicon([word for word in self.words if word.isascii()], fuzzy_max_distance)
+
+        # Group name -> source pattern, so a match can report which pattern fired
+        self.pattern_sources = {}
+        alternatives = []
+        for pattern in dict.fromkeys(slang_patterns):  # drop duplicates, keep order
+            group_name = f"pattern_{len(self.pattern_sources)}"
+            self.pattern_sources[group_name] = pattern
+            pattern = normalize_bengali(pattern)
+            alternatives.append(f"(?P<{group_name}>{PATTERN_WORD_START}(?:{pattern}){PATTERN_WORD_END})")
+        self.pattern_regex = re.compile("|".join(alternatives)) if alternatives else None
+
+    # Attributes saved in the lexicon artifact, besides the automaton, fuzzy index and regex
+    compiled_attributes = ("greetings", "phrases", "words", "false_positives", "covered_by_transliteration", "combinations",
+                           "combination_parts", "transliterated_entries", "allowlist", "fuzzy_allowlist",
+                           "pattern_sources")
+    compiled_sets = ("phrases", "words", "covered_by_transliteration", "combination_parts", "transliterated_entries",
+                     "allowlist", "fuzzy_allowlist")
+
+    def to_compiled(self):
+        """
+        Data form of the compiled matcher: JSON-compatible values (sets as sorted lists) plus the
+        automaton's flat arrays, which is what the lexicon artifact stores.
+        """
+        compiled = {name: sorted(getattr(self, name)) if name in self.compiled_sets else getattr(self, name)
+                    for name in self.compiled_attributes}
+        compiled["automaton"] = self.automaton.to_compiled()
+        compiled["fuzzy_lexicon"] = self.fuzzy_lexicon.to_compiled()
+        compiled["pattern_regex"] = self.pattern_regex.pattern if self.pattern_regex is not None else None
+        return compiled
+
+    @classmethod
+    def from_compiled(cls, compiled):
+        """Rebuilds a matcher from to_compiled() output without recompiling the lexicon."""
+        matcher = cls.__new__(cls)
+        for name in cls.compiled_attributes:
+            setattr(matcher, name, set(compiled[name]) if name in cls.compiled_sets else compiled[name])
+        matcher.combinations = [tuple(combo) for combo in matcher.combinations]
+        matcher.automaton = AhoCorasick.from_compiled(compiled["automaton"])
+        matcher.fuzzy_lexicon = FuzzyLexicon.from_compiled(compiled["fuzzy_lexicon"])
+        matcher.pattern_regex = re.compile(compiled["pattern_regex"]) if compiled["pattern_regex"] else None
+        matcher.greeting_matcher = GreetingMatcher(matcher.greetings)
+        return matcher
+
+    @classmethod
+    def from_lexicon(cls, lexicon, fuzzy_max_distance=SLANG_FUZZY_MAX_DISTANCE):
+        return cls(lexicon["truly_offensive_words"], lexicon["false_positives"], lexicon["offensive_combinations"],
+                   lexicon["slang_patterns"], lexicon["fuzzy_safe_words"], fuzzy_max_distance, lexicon["greetings"])
+
+    def find(self, cleaned, original_lower, fuzzy_max_distance=None, overlay=None, comment=None):
+        """
+        Returns the first offensive match in the comment, or None. The match is a dict:
+          rule     - "page_blocklist", "phrase", "word_list", "combination", "pattern" or "fuzzy"
+          term     - the lexicon entry (pattern source, or "a + b" for combinations)
+          spans    - [start, end] in comment (original_lower if not given) for each matched
+                     part, or None where it could not be located
+          matched  - the comment text at each span
+        fuzzy_max_distance overrides the FuzzyLexicon's limit for this call (0 disables it).
+        overlay is the page's PageOverlay, if it has one: its blocked terms are checked first and
+        its allowed terms are never flagged.
+        """
+        cleaned = normalize_bengali(cleaned)
+        original_lower = normalize_bengali(original_lower)
+        text = self.separator.join((cleaned, original_lower, transliterate_banglish(cleaned)))
+        original_start = len(cleaned) + 1
+        original_end = original_start + len(original_lower)
+        flagged_words = []
+        found_parts = {}
+        found_allowlisted = set()
+
+        def explain(rule, term, positions):
+            return self.explain(rule, term, positions, text, cleaned, original_start, original_end,
+                                original_lower if comment is None else comment)
+
+        allowed = frozenset()
+        if overlay is not None:
+            blocked = overlay.find(text)
+            if blocked:
+                key, start, end = blocked
+                return explain("page_blocklist", key, [(start, end)])
+            allowed = overlay.allowed
+
+        for start, end, key in self.automaton.iter_matches(text):
+            if key in allowed or (start > original_end and key not in self.transliterated_entries):
+                continue
+            if key in self.phrases:
+                return explain("phrase", key, [(start, end)])
+            if key in self.words and self.is_whole_word(text, start, end):
+                if key not in self.false_positives:
+                    return explain("word_list", key, [(start, end)])
+                flagged_words.append((key, start, end))
+            if key in self.combination_parts:
+                found_parts.setdefault(key, (start, end))
+            if key in self.allowlist and original_start <= start < original_end:
+                found_allowlisted.add(key)
+
+        # Words with known false positives only count if none of those appear in the original text
+        for word, start, end in flagged_words:
+            if not any(fp in found_allowlisted for fp in self.false_positives[word]):
+                return explain("word_list", word, [(start, end)])
+
+        for combo in self.combinations:
+            if all(part in found_parts for part in combo):
+                return explain("combination", " + ".join(combo), [found_parts[part] for part in combo])
+
+        if self.pattern_regex is not None:
+            for match in self.pattern_regex.finditer(text, 0, original_end):
+                if match.group() not in allowed and not self.is_allowlisted_hit(match.group(), found_allowlisted):
+                    return explain("pattern", self.pattern_sources[match.lastgroup], [match.span()])
+
+        for token_match in ASCII_WORD_RE.finditer(cleaned):
+            token = token_match.group()
+            if token in self.fuzzy_allowlist or token in self.words or token in allowed:
+                continue
+            word = self.fuzzy_lexicon.lookup(token, fuzzy_max_distance)
+            if word and word not in allowed and not any(fp in found_allowlisted for fp in self.false_positives.get(word, ())):
+                return explain("fuzzy", word, [token_match.span()])
+        return None
+
+    def explain(self, rule, term, positions, text, cleaned, original_start, original_end, comment):
+        """Builds find()'s result, mapping positions in the joined text back to spans in comment."""
+        spans = []
+        for start, end in positions:
+            if start >= original_end:
+                # Transliteration segment: map back to the romanized tokens it came from
+                translit_start = original_end + 1
+                first_token = text.count(" ", translit_start, start)
+                last_token = text.count(" ", translit_start, end)
+                tokens = cleaned.split()
+                normalized = " ".join(tokens[first_token:last_token + 1])
+                occurrence = " ".join(tokens[:first_token]).count(normalized)
+            else:
+                segment_start = original_start if start >= original_start else 0
+                normalized = text[start:end].strip()
+                occurrence = text.count(normalized, segment_start, start)
+            spans.append(locate_in_comment(comment, normalized, occurrence))
+        return {
+            "rule": rule,
+            "term": term,
+            "spans": spans,
+            "matched": [comment[span[0]:span[1]] if span else None for span in spans]
+        }
+
+    def check(self, text, normalized=None, fuzzy_max_distance=None, overlay=None, check_greeting=True):
+        """
+        contains_slang() semantics without the logging: returns (greeting, match), where greeting
+        is GreetingMatcher.classify()'s result (greetings are never slang, so match is then None)
+        and match is find()'s result for the comment text. check_greeting=False skips the greeting
+        check for callers that already classified the comment as no greeting.
+        """
+        if not text or not text.strip():
+            return None, None
+        normalized = normalized or normalize_comment(text)
+        original_lower = normalized["lower"].strip()
+        greeting = self.greeting_matcher.classify(original_lower) if check_greeting else None
+        if greeting:
+            return greeting, None
+        return None, self.find(normalized["cleaned"], original_lower, fuzzy_max_distance, overlay, comment=text)
+
+    def is_allowlisted_hit(self, matched, found_allowlisted):
+        """
+        A pattern hit that spells a word with known false positives ("fuuck", "bitch") is dropped
+        like the word itself when one of those appears in the comment ("fuck lucky", "bitch rich").
+        """
+        word = REPEATED_CHAR_RE.sub(r"\1", matched)
+        return word in self.false_positives and any(fp in found_allowlisted for fp in self.false_positives[word])
+
+    @staticmethod
+    def is_whole_word(text, start, end):
+        return ((start == 0 or not is_word_char(text[start - 1])) and
+                (end == len(text) or not is_word_char(text[end])))
+
+
+class PageOverlay:
+    """
+    A page's own additions to the shared SlangMatcher (competitor names, local slurs, words
+    that are fine for that page). Only the page's few blocked terms get an automaton of their
+    own; the base lexicon stays compiled once for all pages.
+    """
+
+    def __init__(self, blocked_terms=(), allowed_terms=()):
+        self.blocked = {normalize_bengali(term.lower().strip()) for term in blocked_terms if term.strip()}
+        allowed = {normalize_bengali(term.lower().strip()) for term in allowed_terms if term.strip()}
+        # Romanized allowed terms are matched in their transliteration too, like the base lexicon
+        self.allowed = frozenset(allowed | {transliterate_banglish(term) for term in allowed if term.isascii()})
+        self.automaton = AhoCorasick(self.blocked)
+        # Identifies the overlay's terms in memo keys
+        self.fingerprint = hashlib.sha1(json.dumps([sorted(self.blocked), sorted(self.allowed)],
+                                                   ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def find(self, text):
+        """
+        Checks the text SlangMatcher.find() builds; multi-word terms match anywhere, words
+        whole-word. Returns (term, start, end) for the first blocked term, or None.
+        """
+        for start, end, key in self.automaton.iter_matches(text):
+            if " " in key or SlangMatcher.is_whole_word(text, start, end):
+                return key, start, end
+        return None
+
+
+# --- Language detection tables ---
+# Script of each character detect_comment_language() counts: characters of a script map to its
+# marker letter, so one pass over the comment bins every character with a single dict lookup.
+LANGUAGE_SCRIPT_RANGES = [
+    ("b", 0x0980, 0x09FF),  # Bengali
+    ("h", 0x0900, 0x097F),  # Devanagari (Hindi)
+    ("a", 0x0600, 0x06FF),  # Arabic
+    ("c", 0x4E00, 0x9FFF),  # Chinese
+    ("j", 0x3040, 0x30FF),  # Japanese (Hiragana and Katakana)
+    ("e", ord("a"), ord("z")), ("e", ord("A"), ord("Z"))  # English
+]
+LANGUAGE_SCRIPT_MARKERS = {chr(code_point): marker for marker, first, last in LANGUAGE_SCRIPT_RANGES
+                           for code_point in range(first, last + 1)}
+
+# Common romanized words; each one found anywhere in the comment adds to its language's score
+ROMANIZED_LANGUAGE_INDICATORS = {
+    'bangla': ['kemon', 'koto', 'taka', 'bhai', 'apa', 'dhonnobad', 'valo', 'bhalo'],
+    'hindi': ['kaise', 'kya', 'hai', 'aap', 'main', 'paisa', 'rupees', 'ji', 'sahab'],
+    'chinese': ['ni', 'hao', 'shi', 'wo', 'yuan', 'kuai', 'xie'],
+    'japanese': ['arigatou', 'sumimasen', 'konnichiwa', 'desu', 'masu', 'yen'],
+    'arabic': ['salam', 'habibi', 'wallah', 'inshallah', 'mashallah']
+}
+ROMANIZED_INDICATOR_LANGUAGES = {word: language for language, words in ROMANIZED_LANGUAGE_INDICATORS.items()
+                                 for word in words}
+ROMANIZED_INDICATOR_AUTOMATON = AhoCorasick(ROMANIZED_INDICATOR_LANGUAGES)
+
+
+def detect_language(comment, comment_lower=None, language_model=None):
+    """
+    Enhanced language detection to support multiple languages.
+    Returns language code: "bangla", "english", "hindi", "chinese", "japanese", "arabic", "mixed"
+    GPT will handle the actual response generation in the detected language.
+    comment_lower is comment.lower(), if the caller already has it. With a language_model,
+    Latin-script comments get its label instead when it is confident enough (see LanguageModel).
+    """
+    if not comment or len(comment.strip()) == 0:
+        return "english"  # Default fallback
+
+    # One pass over the characters bins them by script, one automaton pass finds the indicators
+    counts = dict.fromkeys("bhacje", 0)
+    script_of = LANGUAGE_SCRIPT_MARKERS.get
+    for char in comment:
+        marker = script_of(char)
+        if marker:
+            counts[marker] += 1
+    comment_lower = comment_lower if comment_lower is not None else comment.lower()
+    roman = dict.fromkeys(ROMANIZED_LANGUAGE_INDICATORS, 0)
+    for indicator in {key for _, _, key in ROMANIZED_INDICATOR_AUTOMATON.iter_matches(comment_lower)}:
+        roman[ROMANIZED_INDICATOR_LANGUAGES[indicator]] += 1
+
+    # Calculate total scores
+    scores = {
+        'bangla': counts['b'] + roman['bangla'] * 2,
+        'hindi': counts['h'] + roman['hindi'] * 2,
+        'arabic': counts['a'] + roman['arabic'] * 2,
+        'chinese': counts['c'] + roman['chinese'] * 2,
+        'japanese': counts['j'] + roman['japanese'] * 2,
+        'english': counts['e'] * 0.3  # Lower weight for English as it's common in mixed text
+    }
+
+    # Romanized comments ("kmon asen?") are all Latin letters, so script counts can't tell
+    # Banglish or Hinglish from English; the n-gram model can
+    if language_model is not None and counts['e'] and not any(counts[marker] for marker in "bhacj"):
+        label, confidence = language_model.predict(comment_lower)
+        if confidence >= LANGUAGE_MODEL_MIN_CONFIDENCE:
+            return label
+
+    # Find the language with highest score
+    max_score = max(scores.values())
+    if max_score == 0:
+        return "english"  # Default fallback
+
+    detected_language = max(scores, key=scores.get)
+
+    # Check for mixed language (if multiple languages have significant presence)
+    significant_languages = [lang for lang, score in scores.items() if score > max_score * 0.4]
+    if len(significant_languages) > 1:
+        return "mixed"
+
+    return detected_language
+
+
+# --- Romanized language classifier (optional, needs NumPy) ---
+# Multinomial naive Bayes over hashed character n-grams, trained with train_language_model.py on
+# labeled comments. detect_language() asks it about Latin-script comments only.
+LANGUAGE_MODEL_PATH = os.getenv("LANGUAGE_MODEL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                    "language_model.npz"))
+LANGUAGE_MODEL_MIN_CONFIDENCE = float(os.getenv("LANGUAGE_MODEL_MIN_CONFIDENCE", "0.8"))
+LANGUAGE_LABELS = ("bangla", "english", "hindi", "chinese", "japanese", "arabic")
+
+
+def hashed_ngram_counts(text, num_features, ngram_sizes):
+    """
+    Character n-gram counts of the lowercased text, hashed into num_features buckets with CRC-32
+    (stable across processes, unlike hash()). Words are padded with spaces so n-grams at word
+    edges ("kmo" at the start of "kmon") are features of their own.
+    """
+    padded = " " + " ".join(text.lower().split()) + " "
+    counts = {}
+    for size in ngram_sizes:
+        for start in range(len(padded) - size + 1):
+            bucket = zlib.crc32(padded[start:start + size].encode("utf-8")) % num_features
+            counts[bucket] = counts.get(bucket, 0) + 1
+    return counts
+
+
+class LanguageModel:
+    """
+    Hashed character n-gram naive Bayes language classifier stored as NumPy arrays:
+    log_prior[label] and feature_log_prob[label, bucket]. predict() returns (label, confidence).
+    """
+
+    def __init__(self, labels, log_prior, feature_log_prob, ngram_sizes):
+        self.labels = list(labels)
+        self.log_prior = log_prior
+        self.feature_log_prob = feature_log_prob
+        self.ngram_sizes = tuple(int(size) for size in ngram_sizes)
+        self.num_features = feature_log_prob.shape[1]
+
+    @classmethod
+    def train(cls, samples, num_features=2 ** 16, ngram_sizes=(1, 2, 3, 4), alpha=0.1):
+        """Fits the model on (text, label) pairs, with additive smoothing alpha."""
+        labels = sorted({label for _, label in samples})
+        label_index = {label: i for i, label in enumerate(labels)}
+        feature_counts = np.zeros((len(labels), num_features), dtype=np.float64)
+        sample_counts = np.zeros(len(labels), dtype=np.float64)
+        for text, label in samples:
+            row = label_index[label]
+            sample_counts[row] += 1
+            for bucket, count in hashed_ngram_counts(text, num_features, ngram_sizes).items():
+                feature_counts[row, bucket] += count
+        smoothed = feature_counts + alpha
+        feature_log_prob = np.log(smoothed) - np.log(smoothed.sum(axis=1, keepdims=True))
+        log_prior = np.log(sample_counts / sample_counts.sum())
+        return cls(labels, log_prior.astype(np.float32), feature_log_prob.astype(np.float32), ngram_sizes)
+
+    def predict(self, text):
+        counts = hashed_ngram_counts(text, self.num_features, self.ngram_sizes)
+        if not counts:
+            return self.labels[int(np.argmax(self.log_prior))], 0.0
+        buckets = np.fromiter(counts.keys(), dtype=np.intp, count=len(counts))
+        weights = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        scores = self.log_prior + self.feature_log_prob[:, buckets] @ weights
+        probabilities = np.exp(scores - scores.max())
+        probabilities /= probabilities.sum()
+        best = int(np.argmax(probabilities))
+        return self.labels[best], float(probabilities[best])
+
+    def save(self, path):
+        """Writes the arrays to an .npz file (atomically, like the lexicon artifact)."""
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            np.savez(f, labels=np.array(self.labels), log_prior=self.log_prior,
+                     feature_log_prob=self.feature_log_prob, ngram_sizes=np.array(self.ngram_sizes))
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls([str(label) for label in arrays["labels"]], arrays["log_prior"],
+                       arrays["feature_log_prob"], arrays["ngram_sizes"])
+
+
+def load_language_model(path=LANGUAGE_MODEL_PATH):
+    """Returns the trained LanguageModel at path, or None (no NumPy, no model file, or unreadable)."""
+    if np is None:
+        print("NumPy not installed; language detection uses script counts only")
+        return None
+    try:
+        model = LanguageModel.load(path)
+    except FileNotFoundError:
+        print(f"No language model at {path}; run train_language_model.py to enable it")
+        return None
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Could not load language model {path}: {e}")
+        return None
+    print(f"Loaded language model {path}: labels {model.labels}, {model.num_features} features")
+    return model
+
+
+# --- Moderation lexicon ---
+# Built-in slang lexicon. A JSON data file at SLANG_LEXICON_PATH overrides it key by key and is
+# reloaded while the bot runs (see LexiconWatcher); build_lexicon.py compiles the active lexicon
+# into SLANG_LEXICON_ARTIFACT, which FacebookBot loads at startup.
+DEFAULT_SLANG_LEXICON = {
+    # Slang words and patterns - Only truly offensive content
+    "slang_words": [
+        # Core Bengali abusive terms (most common and offensive)
+        "মাগি", "খানি", "চোদা", "চোদি", "চুদি", "চুদা", "রান্ড", "বেশ্যা", "বাঞ্চোত", "মাদারচোদ",
+        "বাল", "ছাগল", "কুত্তা", "শুয়োর", "গাধা", "বালের", "চুদিরভাই", "খানকি", "খানকির", "চোদ", "চোদনা", "চোদন",
+        "বাইঞ্চোদ", "মদনা",
+
+        # Stronger negative/derogatory terms
+        "হারামি", "হারামজাদা", "কুত্তার বাচ্চা", "শুওরের বাচ্চা", "গাধার বাচ্চা",
+        "বদমাইশ", "নোংরা", "নোংরামি", "ফাউল", "ফাউল্টু", "বেয়াদব", "ছাগলের বাচ্চা", "চোদানির পুত",
+        "খানকির পোলা", "খানকির বাচ্চা", "মাগির পোলা", "মাগির বাচ্চা", "বালের পোলা", "বালের বাচ্চা",
+
+        # Common offensive combinations
+        "পোলা", "বাচ্চা", "ছেলে", "মেয়ে",  # When combined with slang words
+        "হুদা", "বকবক", "তোর কি", "ধুর", "ভ্যাদাইস",
+
+        # Derogatory terms based on physical/mental state (often used as insults)
+        "লেংড়া", "পঙ্গু", "অন্ধ", "বোবা", "কালা", "মোটা", "চিকন", "খোঁড়া", "লুলা", "বোকা", "পাগল", "ছাগল",
+
+        # English explicit words (ensure these are handled with care to avoid false positives)
+        "fuck", "fucking", "fucked", "fucker", "fck", "f*ck", "f**k",
+        "shit", "bullshit", "sh*t", "s**t", "shyt",
+        "bitch", "bitches", "b*tch", "b**ch", "bitch ass",
+        "asshole", "a**hole", "arsehole", "ass", "azz",
+        "dick", "cock", "penis", "d*ck", "c**k", "dik", "cok",
+        "pussy", "vagina", "cunt", "p***y", "c**t", "pusy",
+        "slut", "whore", "prostitute", "sl*t", "wh*re", "hore",
+        "bastard", "b*stard", "b**tard",
+        "dumbass", "stupid", "idiot", "moron", "retard", "dumb", "idiot", "moran",
+        "wtf", "stfu", "gtfo", "kys", "lmao", "lmfao", "omfg", "fml",
+
+        # Bengali romanized slang (expanded significantly)
+        "magi", "khani", "choda", "chodi", "chudi", "chuda", "rand", "banchot", "madarchod",
+        "bal", "chagol", "kutta", "shuyor", "gadha", "baler", "chodirbhai", "codirbhai",
+        "khankir", "khankir pola", "khankir baccha",
+
+        "harami", "haramjada", "kuttar bacha", "shuorer bacha", "gadhar bacha",
+        "badmaish", "nongra", "nongrami", "faul", "faltu", "beyadob", "chagoler bacha", "chodanir put",
+        "magir pola", "magir baccha", "baler pola", "baler baccha",
+
+        "huda", "bokbok", "biriktikor", "faltu", "ajebaje", "tor ki", "dhur", "vadais", "baje",
+
+        "lengra", "pongu", "ondho", "boba", "kala", "mota", "chikon", "khora", "lula", "boka", "pagol",
+
+        # Mixed language slang (Bengali + English)
+        "মাদার চোদ", "ফাক", "শিট", "বিচ", "ড্যাম", "বুলশিট", "ফাকার", "এস হোল", "বালের পোলা",
+        "বালের কথা", "কি বাল", "চোদনা", "খানকি মাগি", "চুদানির পুত", "চোদানির বেটা", "ফাকিং",
+        "বালছাল", "বাল ফালা", "বাল ছিড়া", "বাল ছিড়ে", "মাগীবাজ", "মাগীবাজি",
+        "চোদাচুদি", "চোদান", "চোদান লাগসে", "চুদাচুদি", "চুদিশ", "মাল", "মাল খোর",
+        "খানকির পোলা", "খানকির বাচ্চা", "মাগির বাচ্চা", "ফকিরের বাচ্চা", "কুত্তার বাচ্চা",
+        "শুয়োরের বাচ্চা", "গাধার বাচ্চা", "হারামির বাচ্চা", "বদমাইশের বাচ্চা", "কুরবানি", "ছাগল",
+        "মুড়ি খা", "খাইয়া কাজ নাই", "যা ভাগ", "ভাড়", "গু", "গু-মুত্র", "লেদা", "হাগা",
+        "হারামজাদা পোলা", "যা বাল", "বাল ফালা", "বাল ছিড়া", "মাদারচোদ", "মাগির পোলা",
+        "বালের চুদুর", "হাগা", "হাগিস", "লেদা", "গু"
+    ],
+
+    "slang_patterns": [
+        # Only truly offensive patterns - removed overly broad ones
+        r'f+u+c+k+',  # fuck, fukkk, fukkkk
+        r'b+i+t+c+h+',  # bitch, bitcch
+        r'a+s+s+h+o+l+e+',  # asshole, asshoole
+
+        # Bengali phonetic variations - only truly offensive. Only vowels (and the first and last
+        # letters) may repeat: doubled consonants inside give real words ("Maggi" / magi)
+        r'ch+o+da+', r'ch+u+da+', r'ch+o+di+', r'ch+u+di+',  # choda, chuda variations
+        r'm+a+gi+',  # magi variations
+        r'r+a+nd+',  # rand variations
+        r'b+a+nch+o+t+',  # banchot variations
+        r'h+a+ra+mi+', r'h+a+ra+mja+da+',  # harami, haramjada
+        r'b+e+shya+',  # beshya variations
+
+        # Bengali script variations - only truly offensive. [\u0980-\u09FF]* takes the inflection
+        # ("চোদান", "চুদানির", "চুদিশ", "হারামির"): Bengali vowel signs are part of a word, so the
+        # bare stems no longer match inside longer words
+        r'চো+দা+[\u0980-\u09FF]*', r'চু+দা+[\u0980-\u09FF]*', r'চো+দি+[\u0980-\u09FF]*', r'চু+দি+[\u0980-\u09FF]*',
+        r'মা+গি+[\u0980-\u09FF]*',
+        r'খা+নকি+[\u0980-\u09FF]*',
+        r'রা+ন্ড+[\u0980-\u09FF]*',
+        r'বা+ই?ঞ্চো+[তদ]+[\u0980-\u09FF]*',
+        r'মা+দা+র ?চো+দ[\u0980-\u09FF]*',
+        r'হা+রা+মি+[\u0980-\u09FF]*', r'হা+রা+ম+জা+দা+[\u0980-\u09FF]*',
+        r'বে+শ্যা+[\u0980-\u09FF]*',
+
+        # Leetspeak and creative spellings - only for clear offensive words
+        r'\b(?:f[\W_]*u[\W_]*c[\W_]*k|f[\W_]*u[\W_]*k)\b',  # f_u_c_k, f.u.c.k, fuk
+        r'\b(?:b[\W_]*i[\W_]*t[\W_]*c[\W_]*h)\b',  # b.i.t.c.h
+
+        # Clear offensive combinations - Updated with more comprehensive patterns
+        r'খানকির ?\w*', r'মাগির ?\w*', r'বালের ?\w*', r'চোদানির ?\w*', r'হারামির ?\w*',
+        r'khankir ?\w*', r'magir ?\w*', r'baler ?\w*', r'chodanir ?\w*', r'haramir ?\w*',
+        r'madarchod|motherchod',
+        r'chodir ?bhai|codir ?bhai',
+        r'khanir ?pola|khanir ?baccha|khanir ?magi',
+        r'magir ?pola|magir ?baccha|magir ?chele',
+        r'choda ?chudi|chudachudi',
+
+        # Bengali script offensive combinations - More comprehensive
+        r'খানকির ?\w*', r'মাগির ?\w*', r'বালের ?\w*', r'চোদানির ?\w*',
+        r'মাদার ?চোদ',
+        r'চুদির ?ভাই',
+        r'খানকির ?পোলা|খানকির ?বাচ্চা|খানকির ?মাগি',
+        r'মাগির ?পোলা|মাগির ?বাচ্চা|মাগির ?ছেলে',
+        r'চোদা ?চুদি|চুদাচুদি'
+    ],
+
+    # Words that flag a comment on their own (whole-word match), or as phrases (substring match).
+    # Not "খানি": it is the everyday "a little" ("একটু খানি কমান"); the slur is "খানকি".
+    "truly_offensive_words": [
+        "মাগি", "চোদা", "চোদি", "চুদি", "চুদা", "রান্ড", "বেশ্যা", "বাঞ্চোত", "মাদারচোদ",
+        "হারামি", "হারামজাদা", "কুত্তার বাচ্চা", "শুওরের বাচ্চা", "গাধার বাচ্চা",
+        "চোদানির পুত", "খানকির পোলা", "খানকির বাচ্চা", "মাগির বাচ্চা", "মাগির পোলা",
+        "বালের পোলা", "বালের বাচ্চা", "খানকি", "খানকির",
+        # English truly offensive
+        "fuck", "fucking", "fucker", "motherfucker", "bitch", "whore", "slut", "cunt",
+        # Romanized truly offensive
+        "magi", "choda", "chudi", "madarchod", "harami", "rand", "khankir pola", "khankir baccha"
+    ],
+
+    # Common false positive words to avoid (expanded and refined)
+    "false_positives": {
+        'hell': ['hello', 'shell', 'hell-o', 'hellow', 'hello there'],
+        'ass': ['class', 'pass', 'mass', 'glass', 'grass', 'assistant', 'assalam', 'assalamu', 'assess', 'asset'],
+        'damn': ['adam', 'amsterdam', 'condemn'],
+        'shit': ['shirts', 'shift', 'fitting', 'shipping'],
+        'fuck': ['lucky', 'pluck'],
+        'bitch': ['pitch', 'stitch', 'witch', 'rich'],
+        'bal': ['football', 'balcony', 'bhalobasa', 'global', 'tribal'],
+        'gu': ['gum', 'gulab', 'guitar', 'regular', 'singular'],
+        'mal': ['malum', 'malik', 'animal', 'formal', 'normal', 'thermal']
+    },
+
+    # Offensive combinations (like "খানকির + পোলা"): flagged when every part appears anywhere
+    "offensive_combinations": [
+        ["খানকির", "পোলা"], ["খানকির", "বাচ্চা"], ["মাগির", "পোলা"], ["মাগির", "বাচ্চা"],
+        ["বালের", "পোলা"], ["বালের", "বাচ্চা"], ["চোদানির", "পুত"], ["হারামির", "বাচ্চা"],
+        ["khankir", "pola"], ["khankir", "baccha"], ["magir", "pola"], ["magir", "baccha"]
+    ],
+
+    # Everyday words one edit away from an English/romanized slang word, so fuzzy matching
+    # leaves them alone (the false_positives words above are skipped too)
+    "fuzzy_safe_words": [
+        'batch', 'botch', 'butch', 'birch', 'bitty',
+        'where', 'whole', 'whose', 'wore', 'whorl',
+        'tucker', 'randy'
+    ],
+
+    # Comprehensive greetings list - these should NEVER be flagged as slang
+    "greetings": [
+        'hello', 'hi', 'hey', 'hellow', 'helo', 'hii', 'hiii', 'hello there',
+        'hi there', 'hey there', 'assalamu alaikum', 'assalamualaikum', 'salam',
+        'walaikum assalam', 'walaikumsalam', 'স্বাগতম', 'নমস্কার', 'হ্যালো', 'হাই',
+        'আসসালামু আলাইকুম', 'আসসালামুয়ালাইকুম', 'ওয়ালাইকুম সালাম',
+        'ওয়ালাইকুমুসসালাম', 'সালাম', 'কেমন আছেন', 'কেমন আছো', 'কেমন আছ',
+        'kemon asen', 'kemon acho', 'kemon achen', 'ki obostha', 'ki khobor',
+        'good morning', 'good afternoon', 'good evening', 'good night',
+        'শুভ সকাল', 'শুভ দুপুর', 'শুভ সন্ধ্যা', 'শুভ রাত্রি', 'namaste', 'नमस्ते',
+        'konnichiwa', 'arigatou', 'ni hao', 'xie xie', 'marhaba', 'ahlan'
+    ]
+}
+
+# Clean comments no lexicon may flag: brand and product names and everyday phrases that sit
+# close to slang entries. The startup self-test and build_lexicon.py check them.
+CLEAN_COMMENT_REGRESSIONS = [
+    # Brands and products sold on our pages
+    "Maggi", "Maggi noodles price?", "ম্যাগি নুডলস", "Magic pot koto?", "Cocola noodles", "Harpic",
+    "Dettol", "Horlicks", "Radhuni masala", "Pran juice", "Ruchi chanachur", "Dano milk", "Marks milk",
+    "Bashundhara tissue", "Walton fridge", "Singer sewing machine", "Lux soap", "Dabur honey",
+    "Basmati rice", "Chashi aromatic rice", "Shitol pati", "Kashmiri shawl", "Assam tea",
+    "Haramain perfume", "Grand Sultan", "brand new", "Cockpit", "Dickies pant", "Pussycat", "Cassava",
+    # Everyday phrases
+    "একটু খানি কমান", "খানিকটা", "ektu khani dam komate paren?",
+    # A word with false_positives is not flagged when one of them is in the comment, whether the
+    # word list or a slang_patterns entry found it
+    "bitch rich", "fuck lucky",
+]
+
+# Offensive comments every lexicon must flag: inflected forms a whole-word check could miss
+# ("চোদান" is not the word "চোদা"). The startup self-test and build_lexicon.py check them.
+OFFENSIVE_COMMENT_REGRESSIONS = [
+    "চুদানির পুত", "চোদানির পুত", "চোদান", "চোদান লাগসে", "চুদিশ", "চুদিরভাই", "চোদাচুদি", "চুদাচুদি",
+    "মাগির পোলা", "মাগিগুলা", "খানকি", "খানকির বাচ্চা", "খানকিগুলা", "হারামির বাচ্চা", "হারামজাদার দল",
+    "মাদারচোদ", "বাইঞ্চোদ", "বেশ্যার দল", "magir pola", "khankir pola", "harami", "fuck you", "bitch",
+]
+
+
+def find_clean_regressions(matcher):
+    """The CLEAN_COMMENT_REGRESSIONS entries matcher flags (empty when the lexicon is fine)."""
+    return [comment for comment in CLEAN_COMMENT_REGRESSIONS if matcher.check(comment)[1] is not None]
+
+
+def find_offensive_regressions(matcher):
+    """The OFFENSIVE_COMMENT_REGRESSIONS entries matcher misses (empty when the lexicon is fine)."""
+    return [comment for comment in OFFENSIVE_COMMENT_REGRESSIONS if matcher.check(comment)[1] is None]
+
+
+SLANG_LEXICON_PATH = os.getenv("SLANG_LEXICON_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                  "slang_lexicon.json"))
+SLANG_LEXICON_POLL_SECONDS = float(os.getenv("SLANG_LEXICON_POLL_SECONDS", "5"))  # 0 disables hot reload
+
+
+def read_lexicon_source(path=SLANG_LEXICON_PATH):
+    """
+    Returns the lexicon from the JSON data file at path: DEFAULT_SLANG_LEXICON with the keys the
+    file sets replaced, or DEFAULT_SLANG_LEXICON itself if there is no file. Raises ValueError if
+    the file is not valid JSON or has unknown keys, values of the wrong type or patterns that
+    don't compile.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return DEFAULT_SLANG_LEXICON
+    if not isinstance(data, dict):
+        raise ValueError(f"{path} must contain a JSON object")
+
+    lexicon = dict(DEFAULT_SLANG_LEXICON)
+    for key, value in data.items():
+        if key not in DEFAULT_SLANG_LEXICON:
+            raise ValueError(f"Unknown lexicon key '{key}' in {path}")
+        if not is_valid_lexicon_value(key, value):
+            raise ValueError(f"Lexicon key '{key}' in {path} must be {LEXICON_VALUE_SHAPES[key]}")
+        if key == "slang_patterns":
+            for pattern in value:
+                try:
+                    re.compile(pattern)
+                except re.error as e:
+                    raise ValueError(f"Slang pattern {pattern!r} in {path} does not compile: {e}") from e
+        lexicon[key] = value
+    return lexicon
+
+
+LEXICON_VALUE_SHAPES = {
+    "slang_words": "a list of strings",
+    "slang_patterns": "a list of strings",
+    "truly_offensive_words": "a list of strings",
+    "fuzzy_safe_words": "a list of strings",
+    "greetings": "a list of strings",
+    "false_positives": "an object mapping words to lists of strings",
+    "offensive_combinations": "a list of non-empty lists of strings",
+}
+
+
+def is_valid_lexicon_value(key, value):
+    def is_string_list(items):
+        return isinstance(items, list) and all(isinstance(item, str) for item in items)
+
+    if key == "false_positives":
+        return isinstance(value, dict) and all(is_string_list(fps) for fps in value.values())
+    if key == "offensive_combinations":
+        return isinstance(value, list) and all(is_string_list(combo) and combo for combo in value)
+    return is_string_list(value)
+
+
+class LexiconWatcher:
+    """
+    Polls the lexicon data file and calls bot.reload_lexicon() when its modification time or
+    size changes. The reload compiles on this thread, so request threads never wait for it.
+    """
+
+    def __init__(self, bot, path, poll_seconds):
+        self.bot = bot
+        self.path = path
+        self.poll_seconds = poll_seconds
+        self.signature = self.file_signature()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True, name="lexicon-watcher")
+
+    def file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        while not self.stop_event.wait(self.poll_seconds):
+            signature = self.file_signature()
+            if signature != self.signature:
+                self.signature = signature
+                print(f"Lexicon file {self.path} changed, reloading")
+                try:
+                    self.bot.reload_lexicon(self.path)
+                except Exception as e:  # Keep watching: the next save may fix the file
+                    print(f"Lexicon reload from {self.path} failed: {e}")
+
+
+# --- Precompiled lexicon artifact ---
+# Built by build_lexicon.py. Bump LEXICON_ARTIFACT_FORMAT whenever SlangMatcher.to_compiled() changes.
+# Layout: LEXICON_ARTIFACT_MAGIC, the header length (4 bytes, little-endian), a JSON header with
+# the matcher's data, then the matcher's flat int arrays, each 8-byte aligned. The header never
+# holds code, so reading an artifact can't execute anything.
+SLANG_LEXICON_ARTIFACT = os.getenv("SLANG_LEXICON_ARTIFACT", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                          "slang_lexicon.bin"))
+LEXICON_ARTIFACT_FORMAT = 5
+LEXICON_ARTIFACT_MAGIC = b"SLANGLEX"
+
+
+def get_lexicon_version(lexicon, fuzzy_max_distance=SLANG_FUZZY_MAX_DISTANCE):
+    """Content hash of the lexicon and everything that affects how it compiles, e.g. 'lex-3f9c2a61b0d4'."""
+    source = json.dumps([LEXICON_ARTIFACT_FORMAT, fuzzy_max_distance, lexicon], sort_keys=True, ensure_ascii=False)
+    return "lex-" + hashlib.sha256(source.encode("utf-8")).hexdigest()[:12]
+
+
+def align_to_8(offset):
+    return (offset + 7) // 8 * 8
+
+
+def split_out_arrays(value, arrays):
+    """Copy of value (nested dicts) with each array.array moved to arrays and replaced by {"__array__": index}."""
+    if isinstance(value, array.array):
+        arrays.append(value)
+        return {"__array__": len(arrays) - 1}
+    if isinstance(value, dict):
+        return {key: split_out_arrays(item, arrays) for key, item in value.items()}
+    return value
+
+
+def join_in_arrays(value, arrays):
+    """Inverse of split_out_arrays()."""
+    if isinstance(value, dict):
+        if "__array__" in value:
+            return arrays[value["__array__"]]
+        return {key: join_in_arrays(item, arrays) for key, item in value.items()}
+    return value
+
+
+def build_lexicon_artifact(path=SLANG_LEXICON_ARTIFACT, lexicon=DEFAULT_SLANG_LEXICON,
+                           fuzzy_max_distance=SLANG_FUZZY_MAX_DISTANCE):
+    """Compiles the lexicon and writes it to path (atomically, so running workers never see half a file)."""
+    matcher = SlangMatcher.from_lexicon(lexicon, fuzzy_max_distance)
+    arrays = []
+    header = {
+        "format": LEXICON_ARTIFACT_FORMAT,
+        "version": get_lexicon_version(lexicon, fuzzy_max_distance),
+        "built_at": datetime.now().isoformat(timespec="seconds"),
+        "byteorder": sys.byteorder,
+        "matcher": split_out_arrays(matcher.to_compiled(), arrays),
+        "arrays": []  # [typecode, itemsize, offset from the data section, length]
+    }
+    offset = 0
+    for values in arrays:
+        header["arrays"].append([values.typecode, values.itemsize, offset, len(values)])
+        offset = align_to_8(offset + values.itemsize * len(values))
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    data_start = align_to_8(len(LEXICON_ARTIFACT_MAGIC) + 4 + len(header_bytes))
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(LEXICON_ARTIFACT_MAGIC + len(header_bytes).to_bytes(4, "little") + header_bytes)
+        for values, (_, _, array_offset, _) in zip(arrays, header["arrays"]):
+            f.write(b"\0" * (data_start + array_offset - f.tell()))
+            values.tofile(f)
+    os.replace(temp_path, path)
+    return header["version"]
+
+
+def read_lexicon_artifact(path):
+    """
+    Maps the artifact at path and returns its header, with the matcher's flat arrays as
+    memoryviews into the mapping. The arrays (the automaton's transition table, the bulk of a
+    large lexicon) are never copied into the process: every worker that loads the same file
+    reads the same page-cache pages. The rest of the matcher (keys, allowlists, fuzzy index) is
+    small and is built from the JSON header in each process.
+    Raises ValueError for anything but a well-formed artifact written on this platform.
+    """
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    header_start = len(LEXICON_ARTIFACT_MAGIC) + 4
+    if mapped[:len(LEXICON_ARTIFACT_MAGIC)] != LEXICON_ARTIFACT_MAGIC:
+        raise ValueError(f"{path} is not a slang lexicon artifact")
+    header_length = int.from_bytes(mapped[len(LEXICON_ARTIFACT_MAGIC):header_start], "little")
+    header = json.loads(mapped[header_start:header_start + header_length].decode("utf-8"))
+    if header.get("byteorder") != sys.byteorder:
+        raise ValueError(f"{path} was built on a {header.get('byteorder')}-endian machine")
+
+    data_start = align_to_8(header_start + header_length)
+    view = memoryview(mapped)
+    arrays = []
+    for typecode, itemsize, offset, length in header["arrays"]:
+        start = data_start + offset
+        if array.array(typecode).itemsize != itemsize or start + itemsize * length > len(mapped):
+            raise ValueError(f"{path} has an array this platform can't map")
+        arrays.append(view[start:start + itemsize * length].cast(typecode))
+    header["matcher"] = join_in_arrays(header["matcher"], arrays)
+    return header
+
+
+def load_slang_matcher(lexicon=DEFAULT_SLANG_LEXICON, path=SLANG_LEXICON_ARTIFACT,
+                       fuzzy_max_distance=SLANG_FUZZY_MAX_DISTANCE):
+    """
+    Returns (SlangMatcher, lexicon version). Uses the artifact at path when it was built from
+    this exact lexicon; otherwise (missing, stale or unreadable) compiles the lexicon here.
+    """
+    version = get_lexicon_version(lexicon, fuzzy_max_distance)
+    start = time.perf_counter()
+    try:
+        artifact = read_lexicon_artifact(path)
+        if artifact.get("format") == LEXICON_ARTIFACT_FORMAT and artifact.get("version") == version:
+            matcher = SlangMatcher.from_compiled(artifact["matcher"])
+            print(f"Loaded slang lexicon {version} (built {artifact['built_at']}) from {path} "
+                  f"in {(time.perf_counter() - start) * 1000:.1f}ms")
+            return matcher, version
+        print(f"Slang lexicon artifact {path} is stale ({artifact.get('version')}, expected {version}); "
+              f"run build_lexicon.py")
+    except FileNotFoundError:
+        print(f"No slang lexicon artifact at {path}; run build_lexicon.py")
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Could not read slang lexicon artifact {path}: {e}")
+
+    start = time.perf_counter()
+    try:
+        matcher = SlangMatcher.from_lexicon(lexicon, fuzzy_max_distance)
+    except (TypeError, AttributeError, KeyError, re.error) as e:
+        raise ValueError(f"Slang lexicon {version} does not compile: {e}") from e
+    print(f"Compiled slang lexicon {version} in {(time.perf_counter() - start) * 1000:.1f}ms")
+    return matcher, version
+
+
+def comment_payload_error(json_data):
+    """
+    Checks the shape of a /process-comment payload before it reaches prepare_reply().
+    Returns an error message for a 400, or None if the payload is well-formed.
+    """
+    if not isinstance(json_data, dict) or not isinstance(json_data.get("data"), dict):
+        return "Invalid JSON data"
+    data = json_data["data"]
+    for name in ("page_info", "post_info", "comment_info"):
+        if not isinstance(data.get(name, {}), dict):
+            return f"{name} must be an object"
+    if not isinstance(data.get("comment_info", {}).get("comment_text", ""), str):
+        return "comment_text must be a string"
+    return None
+
 
 class FacebookBot:
     def __init__(self):
@@ -26,13 +1871,6 @@ class FacebookBot:
 
         print(f"Initialized FacebookBot with model: {self.model} via OpenRouter")
 
-        # Test slang detection with known offensive words
-        test_words = ["খানকির পোলা", "মাগির বাচ্চা", "আসসালামু আলাইকুম", "ভালো আছি"]
-        print("Testing slang detection:")
-        for word in test_words:
-            result = self.contains_slang(word)
-            print(f"  '{word}' -> {'SLANG' if result else 'CLEAN'}")
-
         # Headers for API requests - Updated for OpenRouter
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
@@ -41,6 +1879,9 @@ class FacebookBot:
             "X-Title": "Facebook Comment Bot"  # Optional: your app name
         }
 
+        # Shared keep-alive session for OpenRouter calls
+        self.session = http_session
+
         # Initialize the tokenizer for the chosen model
         try:
             self.tokenizer = tiktoken.encoding_for_model(self.model)
@@ -57,108 +1898,100 @@ class FacebookBot:
         # Example: {"page_id_1": 45, "page_id_2": 20}
         self.comment_counts = {}
 
-        # Slang words and patterns - Only truly offensive content
-        self.slang_words = [
-            # Core Bengali abusive terms (most common and offensive)
-            "মাগি", "খানি", "চোদা", "চোদি", "চুদি", "চুদা", "রান্ড", "বেশ্যা", "বাঞ্চোত", "মাদারচোদ",
-            "বাল", "ছাগল", "কুত্তা", "শুয়োর", "গাধা", "বালের", "চুদিরভাই", "খানকি", "খানকির", "চোদ", "চোদনা", "চোদন",
-            "বাইঞ্চোদ", "মদনা",
-
-            # Stronger negative/derogatory terms
-            "হারামি", "হারামজাদা", "কুত্তার বাচ্চা", "শুওরের বাচ্চা", "গাধার বাচ্চা",
-            "বদমাইশ", "নোংরা", "নোংরামি", "ফাউল", "ফাউল্টু", "বেয়াদব", "ছাগলের বাচ্চা", "চোদানির পুত",
-            "খানকির পোলা", "খানকির বাচ্চা", "মাগির পোলা", "মাগির বাচ্চা", "বালের পোলা", "বালের বাচ্চা",
-
-            # Common offensive combinations
-            "পোলা", "বাচ্চা", "ছেলে", "মেয়ে",  # When combined with slang words
-            "হুদা", "বকবক", "তোর কি", "ধুর", "ভ্যাদাইস",
-
-            # Derogatory terms based on physical/mental state (often used as insults)
-            "লেংড়া", "পঙ্গু", "অন্ধ", "বোবা", "কালা", "মোটা", "চিকন", "খোঁড়া", "লুলা", "বোকা", "পাগল", "ছাগল",
-
-            # English explicit words (ensure these are handled with care to avoid false positives)
-            "fuck", "fucking", "fucked", "fucker", "fck", "f*ck", "f**k",
-            "shit", "bullshit", "sh*t", "s**t", "shyt",
-            "bitch", "bitches", "b*tch", "b**ch", "bitch ass",
-            "asshole", "a**hole", "arsehole", "ass", "azz",
-            "dick", "cock", "penis", "d*ck", "c**k", "dik", "cok",
-            "pussy", "vagina", "cunt", "p***y", "c**t", "pusy",
-            "slut", "whore", "prostitute", "sl*t", "wh*re", "hore",
-            "bastard", "b*stard", "b**tard",
-            "dumbass", "stupid", "idiot", "moron", "retard", "dumb", "idiot", "moran",
-            "wtf", "stfu", "gtfo", "kys", "lmao", "lmfao", "omfg", "fml",
-
-            # Bengali romanized slang (expanded significantly)
-            "magi", "khani", "choda", "chodi", "chudi", "chuda", "rand", "banchot", "madarchod",
-            "bal", "chagol", "kutta", "shuyor", "gadha", "baler", "chodirbhai", "codirbhai",
-            "khankir", "khankir pola", "khankir baccha",
-
-            "harami", "haramjada", "kuttar bacha", "shuorer bacha", "gadhar bacha",
-            "badmaish", "nongra", "nongrami", "faul", "faltu", "beyadob", "chagoler bacha", "chodanir put",
-            "magir pola", "magir baccha", "baler pola", "baler baccha",
-
-            "huda", "bokbok", "biriktikor", "faltu", "ajebaje", "tor ki", "dhur", "vadais", "baje",
-
-            "lengra", "pongu", "ondho", "boba", "kala", "mota", "chikon", "khora", "lula", "boka", "pagol",
-
-            # Mixed language slang (Bengali + English)
-            "মাদার চোদ", "ফাক", "শিট", "বিচ", "ড্যাম", "বুলশিট", "ফাকার", "এস হোল", "বালের পোলা",
-            "বালের কথা", "কি বাল", "চোদনা", "খানকি মাগি", "চুদানির পুত", "চোদানির বেটা", "ফাকিং",
-            "বালছাল", "বাল ফালা", "বাল ছিড়া", "বাল ছিড়ে", "মাগীবাজ", "মাগীবাজি",
-            "চোদাচুদি", "চোদান", "চোদান লাগসে", "চুদাচুদি", "চুদিশ", "মাল", "মাল খোর",
-            "খানকির পোলা", "খানকির বাচ্চা", "মাগির বাচ্চা", "ফকিরের বাচ্চা", "কুত্তার বাচ্চা",
-            "শুয়োরের বাচ্চা", "গাধার বাচ্চা", "হারামির বাচ্চা", "বদমাইশের বাচ্চা", "কুরবানি", "ছাগল",
-            "মুড়ি খা", "খাইয়া কাজ নাই", "যা ভাগ", "ভাড়", "গু", "গু-মুত্র", "লেদা", "হাগা",
-            "হারামজাদা পোলা", "যা বাল", "বাল ফালা", "বাল ছিড়া", "মাদারচোদ", "মাগির পোলা",
-            "বালের চুদুর", "হাগা", "হাগিস", "লেদা", "গু"
-        ]
+        # Optional n-gram classifier for romanized (Latin-script) Bengali/Hindi comments
+        self.language_model = load_language_model()
+
+        # Moderation lexicon (DEFAULT_SLANG_LEXICON, or the data file at SLANG_LEXICON_PATH). The word
+        # lists and slang_patterns become a single Aho-Corasick automaton and a single union regex,
+        # read from the prebuilt artifact when it matches this lexicon
+        self.lexicon_reload_lock = threading.Lock()
+        self.lexicon_reload_error = None  # why the last reload failed, if it did
+        lexicon = read_lexicon_source()
+        self.apply_lexicon(lexicon, *load_slang_matcher(lexicon))
 
-        self.slang_patterns = [
-            # Only truly offensive patterns - removed overly broad ones
-            r'f+u+c+k+',  # fuck, fukkk, fukkkk
-            r'b+i+t+c+h+',  # bitch, bitcch
-            r'a+s+s+h+o+l+e+',  # asshole, asshoole
-
-            # Bengali phonetic variations - only truly offensive
-            r'ch+o+d+a+', r'ch+u+d+a+', r'ch+o+d+i+', r'ch+u+d+i+',  # choda, chuda variations
-            r'm+a+g+i+',  # magi variations
-            r'r+a+n+d+',  # rand variations
-            r'b+a+n+c+h+o+t+',  # banchot variations
-            r'h+a+r+a+m+i+', r'h+a+r+a+m+j+a+d+a+',  # harami, haramjada
-            r'b+e+s+h+y+a+',  # beshya variations
-
-            # Bengali script variations - only truly offensive
-            r'চো+দা+', r'চু+দা+', r'চো+দি+', r'চু+দি+',
-            r'মা+গি+',
-            r'রা+ন্ড+',
-            r'বা+ঞ্চো+ত+',
-            r'হা+রা+মি+', r'হা+রা+ম+জা+দা+',
-            r'বে+শ্যা+',
-
-            # Leetspeak and creative spellings - only for clear offensive words
-            r'\b(?:f[\W_]*u[\W_]*c[\W_]*k|f[\W_]*u[\W_]*k)\b',  # f_u_c_k, f.u.c.k, fuk
-            r'\b(?:b[\W_]*i[\W_]*t[\W_]*c[\W_]*h)\b',  # b.i.t.c.h
-
-            # Clear offensive combinations - Updated with more comprehensive patterns
-            r'খানকির ?\w*', r'মাগির ?\w*', r'বালের ?\w*', r'চোদানির ?\w*', r'হারামির ?\w*',
-            r'khankir ?\w*', r'magir ?\w*', r'baler ?\w*', r'chodanir ?\w*', r'haramir ?\w*',
-            r'madarchod|motherchod',
-            r'chodir ?bhai|codir ?bhai',
-            r'khanir ?pola|khanir ?baccha|khanir ?magi',
-            r'magir ?pola|magir ?baccha|magir ?chele',
-            r'choda ?chudi|chudachudi',
-
-            # Bengali script offensive combinations - More comprehensive
-            r'খানকির ?\w*', r'মাগির ?\w*', r'বালের ?\w*', r'চোদানির ?\w*',
-            r'মাদার ?চোদ',
-            r'চুদির ?ভাই',
-            r'খানকির ?পোলা|খানকির ?বাচ্চা|খানকির ?মাগি',
-            r'মাগির ?পোলা|মাগির ?বাচ্চা|মাগির ?ছেলে',
-            r'চোদা ?চুদি|চুদাচুদি'
-        ]
         # Keep track of processed comment IDs to avoid incrementing count for duplicate requests
         self.processed_comment_ids = set()
 
+        # The bot is shared by all request threads, so every read-modify-write of the
+        # counters and history above goes through this lock
+        self.state_lock = threading.RLock()
+
+        # Duplicate deliveries of a comment share one reply instead of each calling the LLM
+        self.reply_coalescer = ReplyCoalescer(IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_MAX_ENTRIES)
+
+        # Replies to identical comments on the same post, stored without the commenter's name
+        self.reply_cache = LRUCache(REPLY_CACHE_SIZE, REPLY_CACHE_TTL_SECONDS)
+        self.tokens_saved = 0
+        # Page/post prompt fragments, rebuilt only when the post or page name changes
+        self.prompt_fragment_cache = LRUCache(PROMPT_FRAGMENT_CACHE_SIZE)
+        # Compiled per-page blocklists/allowlists, keyed by their terms so pages with the same lists share one
+        self.page_overlay_cache = LRUCache(PAGE_OVERLAY_CACHE_SIZE)
+        # Local analysis results for recurring comments, keyed by a digest of the raw text
+        memo_bytes = ANALYSIS_MEMO_MAX_BYTES // 4
+        self.analysis_memos = {name: LRUCache(memo_bytes // 200, max_bytes=memo_bytes)
+                               for name in ("slang", "language", "sentiment", "name_patterns")}
+        # ...and to near-identical ones ("koto dam" / "dam koto?"), matched per post
+        self.near_duplicate_cache = NearDuplicateCache(NEAR_DUP_THRESHOLD, NEAR_DUP_MAX_PER_POST,
+                                                       NEAR_DUP_MAX_POSTS, NEAR_DUP_AUDIT_RATE,
+                                                       ttl=REPLY_CACHE_TTL_SECONDS, max_bytes=NEAR_DUP_MAX_BYTES)
+
+        # Test slang detection with known offensive words
+        test_words = ["খানকির পোলা", "মাগির বাচ্চা", "আসসালামু আলাইকুম", "ভালো আছি"]
+        print("Testing slang detection:")
+        for word in test_words:
+            result = self.contains_slang(word)
+            print(f"  '{word}' -> {'SLANG' if result else 'CLEAN'}")
+        regressions = find_clean_regressions(self.slang_matcher)
+        if regressions:
+            print(f"WARNING: slang lexicon flags clean comments: {regressions}")
+        missed = find_offensive_regressions(self.slang_matcher)
+        if missed:
+            print(f"WARNING: slang lexicon misses offensive comments: {missed}")
+        near_duplicate_regressions = find_near_duplicate_regressions(NEAR_DUP_THRESHOLD)
+        if near_duplicate_regressions:
+            print(f"WARNING: near-duplicate reuse would answer these comments with each other's reply: "
+                  f"{near_duplicate_regressions}")
+
+    # --- Moderation lexicon ---
+    def apply_lexicon(self, lexicon, matcher, version):
+        """
+        Makes a compiled lexicon live. contains_slang() reads self.slang_matcher once per call,
+        so a single assignment swaps it in: a check in progress finishes on the old matcher and
+        no check ever sees a partly built one.
+        """
+        matcher.lexicon_version = version  # memoized slang results are keyed by it
+        matcher.lexicon = lexicon  # bulk moderation workers rebuild the matcher from it
+        self.slang_matcher = matcher
+        self.lexicon_version = version
+        self.lexicon = lexicon
+        self.slang_words = lexicon["slang_words"]
+        self.slang_patterns = lexicon["slang_patterns"]
+        self.truly_offensive_words = lexicon["truly_offensive_words"]
+        self.false_positives = lexicon["false_positives"]
+        self.offensive_combinations = lexicon["offensive_combinations"]
+        self.fuzzy_safe_words = lexicon["fuzzy_safe_words"]
+        self.greetings = lexicon["greetings"]
+        print(f"Slang lexicon {version} active; romanized slang covered by transliteration: "
+              f"{sorted(matcher.covered_by_transliteration)}")
+
+    def reload_lexicon(self, path=SLANG_LEXICON_PATH):
+        """
+        Reads and compiles the lexicon at path and swaps it in. Returns the active version; on a
+        bad file the current lexicon stays live. Comment counts and history are untouched.
+        """
+        with self.lexicon_reload_lock:
+            try:
+                lexicon = read_lexicon_source(path)
+                matcher, version = load_slang_matcher(lexicon)
+            except (OSError, ValueError) as e:
+                print(f"Lexicon reload from {path} failed, keeping {self.lexicon_version}: {e}")
+                self.lexicon_reload_error = str(e)
+                return self.lexicon_version
+            self.lexicon_reload_error = None
+            if version != self.lexicon_version:
+                self.apply_lexicon(lexicon, matcher, version)
+            return self.lexicon_version
+
     # --- Token Counting Method ---
     def count_tokens(self, text):
         """Counts the number of tokens in a given text using the initialized tokenizer."""
@@ -186,13 +2019,27 @@ class FacebookBot:
 
     def increment_comment_count(self, page_id, comment_id):
         """Increments the comment count for a given page, ensuring each unique comment_id is counted only once."""
-        if comment_id not in self.processed_comment_ids:
-            self.comment_counts[page_id] = self.comment_counts.get(page_id, 0) + 1
-            self.processed_comment_ids.add(comment_id)
+        with self.state_lock:
+            if comment_id not in self.processed_comment_ids:
+                self.comment_counts[page_id] = self.comment_counts.get(page_id, 0) + 1
+                self.processed_comment_ids.add(comment_id)
 
     def get_comment_count(self, page_id):
         """Gets the current comment count for a given page."""
-        return self.comment_counts.get(page_id, 0)
+        with self.state_lock:
+            return self.comment_counts.get(page_id, 0)
+
+    def reserve_comment_slot(self, page_id, comment_id, provided_max_limit):
+        """
+        Atomically checks the page limit and counts the comment against it.
+        Returns False if the limit was already reached. Doing both steps under one lock
+        keeps concurrent requests for the same page from overshooting the limit.
+        """
+        with self.state_lock:
+            if self.is_limit_reached(page_id, provided_max_limit):
+                return False
+            self.increment_comment_count(page_id, comment_id)
+            return True
 
     def is_limit_reached(self, page_id, provided_max_limit):
         """
@@ -212,18 +2059,20 @@ class FacebookBot:
         This context helps the bot remember details about the page and the specific post.
         """
         context_key = f"{page_id}_{post_id}"
-        self.conversation_context[context_key] = {
-            "page_info": page_info,
-            "post_info": post_info,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
+        with self.state_lock:
+            self.conversation_context[context_key] = {
+                "page_info": page_info,
+                "post_info": post_info,
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            }
 
     def get_conversation_context(self, page_id, post_id):
         """
         Retrieve stored context for a specific page and post.
         """
         context_key = f"{page_id}_{post_id}"
-        return self.conversation_context.get(context_key, {})
+        with self.state_lock:
+            return self.conversation_context.get(context_key, {})
 
     def add_comment_history(self, page_id, post_id, comment_data):
         """
@@ -231,26 +2080,63 @@ class FacebookBot:
         in subsequent replies. Keeps only the last 10 comments to manage memory usage.
         """
         context_key = f"{page_id}_{post_id}"
-        if context_key not in self.previous_comments:
-            self.previous_comments[context_key] = []
-
-        self.previous_comments[context_key].append({
-            "comment_id": comment_data.get("comment_id", ""),
-            "comment_text": comment_data.get("comment_text", ""),
-            "commenter_name": comment_data.get("commenter_name", ""),
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M")
-        })
-        # Keep only last 10 comments for context for this specific page_post
-        if len(self.previous_comments[context_key]) > 10:
-            self.previous_comments[context_key].pop(0)
+        with self.state_lock:
+            if context_key not in self.previous_comments:
+                self.previous_comments[context_key] = []
+
+            self.previous_comments[context_key].append({
+                "comment_id": comment_data.get("comment_id", ""),
+                "comment_text": comment_data.get("comment_text", ""),
+                "commenter_name": comment_data.get("commenter_name", ""),
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M")
+            })
+            # Keep only last 10 comments for context for this specific page_post
+            if len(self.previous_comments[context_key]) > 10:
+                self.previous_comments[context_key].pop(0)
+
+    def get_recent_comments(self, page_id, post_id, count=3):
+        """
+        Returns a copy of the last `count` comments for a page and post, so callers can
+        build prompts without holding the lock while other threads append history.
+        """
+        context_key = f"{page_id}_{post_id}"
+        with self.state_lock:
+            return list(self.previous_comments.get(context_key, [])[-count:])
+
+    # --- Memoized local analysis ---
+    def analysis_memo_key(self, text, *context):
+        """
+        Memo key for an analysis of text: a digest of the raw text (so long comments don't sit in
+        memory twice) plus whatever else the result depends on. None if text isn't worth memoizing.
+        """
+        if not isinstance(text, str) or len(text) > ANALYSIS_MEMO_MAX_TEXT_LENGTH:
+            return None
+        return (hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest(),) + context
+
+    def memoized_analysis(self, name, key, compute):
+        """Returns the memoized result for key in self.analysis_memos[name], computing it on a miss."""
+        if key is None:
+            return compute()
+        memo = self.analysis_memos[name]
+        result = memo.get(key, MEMO_MISS)
+        if result is MEMO_MISS:
+            result = compute()
+            memo.set(key, result)
+        return result
 
     # --- NEW: Name Pattern Analysis ---
-    def analyze_name_patterns(self, comment_text, commenter_name, page_name, company_name):
+    def analyze_name_patterns(self, comment_text, commenter_name, page_name, company_name, normalized=None):
         """
         Analyzes how names are mentioned in the comment to maintain consistency in reply.
-        Returns a dictionary with naming patterns found in the comment.
+        Returns a dictionary with naming patterns found in the comment (memoized per comment and names).
         """
-        comment_lower = comment_text.lower()
+        key = self.analysis_memo_key(comment_text, commenter_name, page_name, company_name)
+        patterns = self.memoized_analysis("name_patterns", key, lambda: self.analyze_name_patterns_uncached(
+            comment_text, commenter_name, page_name, company_name, normalized))
+        return dict(patterns)  # callers get their own copy of the memoized dict
+
+    def analyze_name_patterns_uncached(self, comment_text, commenter_name, page_name, company_name, normalized=None):
+        comment_lower = normalized["lower"] if normalized else comment_text.lower()
         patterns = {
             "mentions_commenter_name": False,
             "mentions_page_name": False,
@@ -308,63 +2194,14 @@ class FacebookBot:
         return patterns
 
     # --- Enhanced Language Detection ---
-    def detect_comment_language(self, comment):
-        """
-        Enhanced language detection to support multiple languages.
-        Returns language code: "bangla", "english", "hindi", "chinese", "japanese", "arabic", "mixed"
-        GPT will handle the actual response generation in the detected language.
-        """
-        if not comment or len(comment.strip()) == 0:
-            return "english"  # Default fallback
-
-        # Unicode ranges for different scripts
-        bangla_chars = len(re.findall(r'[\u0980-\u09FF]', comment))  # Bengali
-        hindi_chars = len(re.findall(r'[\u0900-\u097F]', comment))  # Devanagari (Hindi)
-        arabic_chars = len(re.findall(r'[\u0600-\u06FF]', comment))  # Arabic
-        chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', comment))  # Chinese
-        japanese_chars = len(re.findall(r'[\u3040-\u309F\u30A0-\u30FF]', comment))  # Japanese
-        english_chars = len(re.findall(r'[a-zA-Z]', comment))  # English
-
-        # Simple romanized word detection for better accuracy
-        comment_lower = comment.lower()
-
-        # Common romanized words
-        bangla_indicators = ['kemon', 'koto', 'taka', 'bhai', 'apa', 'dhonnobad', 'valo', 'bhalo']
-        hindi_indicators = ['kaise', 'kya', 'hai', 'aap', 'main', 'paisa', 'rupees', 'ji', 'sahab']
-        chinese_indicators = ['ni', 'hao', 'shi', 'wo', 'yuan', 'kuai', 'xie']
-        japanese_indicators = ['arigatou', 'sumimasen', 'konnichiwa', 'desu', 'masu', 'yen']
-        arabic_indicators = ['salam', 'habibi', 'wallah', 'inshallah', 'mashallah']
-
-        # Count romanized indicators
-        bangla_roman = sum(1 for word in bangla_indicators if word in comment_lower)
-        hindi_roman = sum(1 for word in hindi_indicators if word in comment_lower)
-        chinese_roman = sum(1 for word in chinese_indicators if word in comment_lower)
-        japanese_roman = sum(1 for word in japanese_indicators if word in comment_lower)
-        arabic_roman = sum(1 for word in arabic_indicators if word in comment_lower)
-
-        # Calculate total scores
-        scores = {
-            'bangla': bangla_chars + bangla_roman * 2,
-            'hindi': hindi_chars + hindi_roman * 2,
-            'arabic': arabic_chars + arabic_roman * 2,
-            'chinese': chinese_chars + chinese_roman * 2,
-            'japanese': japanese_chars + japanese_roman * 2,
-            'english': english_chars * 0.3  # Lower weight for English as it's common in mixed text
-        }
-
-        # Find the language with highest score
-        max_score = max(scores.values())
-        if max_score == 0:
-            return "english"  # Default fallback
-
-        detected_language = max(scores, key=scores.get)
-
-        # Check for mixed language (if multiple languages have significant presence)
-        significant_languages = [lang for lang, score in scores.items() if score > max_score * 0.4]
-        if len(significant_languages) > 1:
-            return "mixed"
+    def detect_comment_language(self, comment, normalized=None):
+        """Memoized detect_comment_language_uncached()."""
+        return self.memoized_analysis("language", self.analysis_memo_key(comment),
+                                      lambda: self.detect_comment_language_uncached(comment, normalized))
 
-        return detected_language
+    def detect_comment_language_uncached(self, comment, normalized=None):
+        """Language code for the comment; see detect_language()."""
+        return detect_language(comment, normalized["lower"] if normalized else None, self.language_model)
 
     # --- Slang and Sentiment Detection ---
     def clean_text_for_slang(self, text):
@@ -373,157 +2210,55 @@ class FacebookBot:
         and normalizing repeated characters for better slang detection.
         This function is crucial for robustness.
         """
-        text = text.lower()
-        symbol_replacements = {
-            '@': 'a', '3': 'e', '1': 'i', '0': 'o', '5': 's',
-            '$': 's', '7': 't', '4': 'a', '!': 'i', '*': '',
-            '#': '', '%': '', '&': '', '+': '', '=': '',
-            '_': ' ', '-': ' ',  # Replace hyphens and underscores with spaces to catch spaced-out slang
-            '.': ' ', ',': ' ', ';': ' ', ':': ' ',  # Replace punctuation with spaces
-            '(': ' ', ')': ' ', '[': ' ', ']': ' ', '{': ' ', '}': ' ',
-            '<': ' ', '>': ' ', '/': ' ', '\\': ' ', '|': ' '
-        }
-        for symbol, replacement in symbol_replacements.items():
-            text = text.replace(symbol, replacement)
-
-        # Normalize multiple spaces into a single space
-        text = re.sub(r'\s+', ' ', text).strip()
-
-        # Reduce more than two repetitions of any character (e.g., 'fukkkk' -> 'fukk')
-        text = re.sub(r'(.)\1{2,}', r'\1\1', text)
-
-        return text
+        return clean_text_for_slang(text)
 
-    def contains_slang(self, text):
+    def contains_slang(self, text, normalized=None, fuzzy_max_distance=None, page_overlay=None):
         """
         Enhanced slang detection - focused on truly offensive content with better detection.
+        True if find_slang() reports a match; takes the same arguments.
         """
-        if not text or len(text.strip()) == 0:
-            return False
+        return self.find_slang(text, normalized, fuzzy_max_distance, page_overlay) is not None
 
-        cleaned = self.clean_text_for_slang(text)
-        original_lower = text.lower().strip()
+    def find_slang(self, text, normalized=None, fuzzy_max_distance=None, page_overlay=None, greeting_checked=False):
+        """
+        Slang detection with an explanation: returns the match SlangMatcher.find() reports (rule,
+        lexicon term, spans in text and the matched text), or None if the comment is clean.
+        The word lists and combinations are matched in one pass by self.slang_matcher.
+        `normalized` is the normalize_comment() result for text, if the caller already has it.
+        `fuzzy_max_distance` overrides SLANG_FUZZY_MAX_DISTANCE for this call (0 = exact only).
+        `page_overlay` is the page's PageOverlay from get_page_overlay(), if any.
+        `greeting_checked` tells it the caller already found no greeting in text.
+        """
+        if not text or len(text.strip()) == 0:
+            return None
 
+        matcher = self.slang_matcher  # one matcher for the whole check, even if a reload swaps it meanwhile
         print(f"Checking for slang in: '{text}'")  # Debug log
-        print(f"Cleaned text: '{cleaned}'")  # Debug log
-
-        # Comprehensive greetings list - these should NEVER be flagged as slang
-        greetings = [
-            'hello', 'hi', 'hey', 'hellow', 'helo', 'hii', 'hiii', 'hello there',
-            'hi there', 'hey there', 'assalamu alaikum', 'assalamualaikum', 'salam',
-            'walaikum assalam', 'walaikumsalam', 'স্বাগতম', 'নমস্কার', 'হ্যালো', 'হাই',
-            'আসসালামু আলাইকুম', 'আসসালামুয়ালাইকুম', 'ওয়ালাইকুম সালাম',
-            'ওয়ালাইকুমুসসালাম', 'সালাম', 'কেমন আছেন', 'কেমন আছো', 'কেমন আছ',
-            'kemon asen', 'kemon acho', 'kemon achen', 'ki obostha', 'ki khobor',
-            'good morning', 'good afternoon', 'good evening', 'good night',
-            'শুভ সকাল', 'শুভ দুপুর', 'শুভ সন্ধ্যা', 'শুভ রাত্রি', 'namaste', 'नमस्ते',
-            'konnichiwa', 'arigatou', 'ni hao', 'xie xie', 'marhaba', 'ahlan'
-        ]
-
-        # Check for greetings first
-        for greeting in greetings:
-            if original_lower == greeting or \
-                    original_lower.startswith(greeting + ' ') or \
-                    original_lower.endswith(' ' + greeting) or \
-                    f" {greeting} " in original_lower or \
-                    original_lower.startswith(greeting + ',') or \
-                    original_lower.startswith(greeting + '!'):
-                print(f"Greeting detected: '{greeting}', skipping slang check")
-                return False
-
-        # Legitimate feedback words that should NOT be considered slang
-        legitimate_feedback = [
-            'বাজে', 'খারাপ', 'ভালো না', 'পছন্দ না', 'দাম বেশি', 'expensive', 'costly',
-            'বিরক্তিকর', 'ফালতু', 'আজেবাজে', 'bad', 'poor', 'terrible', 'awful',
-            'disappointed', 'not good', 'not satisfied', 'সন্তুষ্ট না', 'মন্দ',
-            'দেরি', 'late', 'slow', 'ধীর', 'সমস্যা', 'problem', 'issue'
-        ]
-
-        # If comment contains only legitimate feedback words, don't flag as slang
-        for feedback_word in legitimate_feedback:
-            if feedback_word in original_lower and not any(
-                    slang in original_lower for slang in ['মাগি', 'চোদা', 'ফাক', 'বিচ']):
-                # Check if it's ONLY legitimate criticism without actual slang
-                has_real_slang = False
-                for truly_offensive in ['মাগি', 'চোদা', 'চুদা', 'বেশ্যা', 'মাদারচোদ', 'fuck', 'bitch', 'shit']:
-                    if truly_offensive in original_lower or truly_offensive in cleaned:
-                        has_real_slang = True
-                        break
-                if not has_real_slang:
-                    continue  # Don't return False yet, check for actual slang
-
-        # Common false positive words to avoid (expanded and refined)
-        false_positives = {
-            'hell': ['hello', 'shell', 'hell-o', 'hellow', 'hello there'],
-            'ass': ['class', 'pass', 'mass', 'glass', 'grass', 'assistant', 'assalam', 'assalamu', 'assess', 'asset'],
-            'damn': ['adam', 'amsterdam', 'condemn'],
-            'shit': ['shirts', 'shift', 'fitting', 'shipping'],
-            'fuck': ['lucky', 'pluck'],
-            'bitch': ['pitch', 'stitch', 'witch', 'rich'],
-            'bal': ['football', 'balcony', 'bhalobasa', 'global', 'tribal'],
-            'gu': ['gum', 'gulab', 'guitar', 'regular', 'singular'],
-            'mal': ['malum', 'malik', 'animal', 'formal', 'normal', 'thermal']
-        }
-
-        # Method 1: Check for truly offensive words and combinations
-        truly_offensive_words = [
-            "মাগি", "খানি", "চোদা", "চোদি", "চুদি", "চুদা", "রান্ড", "বেশ্যা", "বাঞ্চোত", "মাদারচোদ",
-            "হারামি", "হারামজাদা", "কুত্তার বাচ্চা", "শুওরের বাচ্চা", "গাধার বাচ্চা",
-            "চোদানির পুত", "খানকির পোলা", "খানকির বাচ্চা", "মাগির বাচ্চা", "মাগির পোলা",
-            "বালের পোলা", "বালের বাচ্চা", "খানকি", "খানকির",
-            # English truly offensive
-            "fuck", "fucking", "fucker", "motherfucker", "bitch", "whore", "slut", "cunt",
-            # Romanized truly offensive
-            "magi", "choda", "chudi", "madarchod", "harami", "rand", "khankir pola", "khankir baccha"
-        ]
-
-        # Check for exact matches or word boundary matches
-        for offensive_word in truly_offensive_words:
-            offensive_lower = offensive_word.lower()
 
-            # For multi-word phrases, check if the full phrase exists
-            if ' ' in offensive_word:
-                if offensive_lower in original_lower or offensive_lower in cleaned:
-                    print(f"Slang detected: '{offensive_word}' found in comment")
-                    return True
-            else:
-                # Check if this word has known false positives
-                if offensive_lower in false_positives:
-                    pattern = r'\b' + re.escape(offensive_lower) + r'\b'
-                    matches = re.findall(pattern, cleaned) or re.findall(pattern, original_lower)
-                    if matches:
-                        is_false_positive = False
-                        for fp_word in false_positives[offensive_lower]:
-                            if fp_word in original_lower:
-                                is_false_positive = True
-                                break
-                        if not is_false_positive:
-                            print(f"Slang detected: '{offensive_word}' found in comment")
-                            return True
-                else:
-                    # Normal word boundary check for truly offensive words
-                    pattern = r'\b' + re.escape(offensive_lower) + r'\b'
-                    if re.search(pattern, cleaned) or re.search(pattern, original_lower):
-                        print(f"Slang detected: '{offensive_word}' found in comment")
-                        return True
-
-        # Method 2: Check for offensive combinations (like "খানকির + পোলা")
-        offensive_combinations = [
-            ["খানকির", "পোলা"], ["খানকির", "বাচ্চা"], ["মাগির", "পোলা"], ["মাগির", "বাচ্চা"],
-            ["বালের", "পোলা"], ["বালের", "বাচ্চা"], ["চোদানির", "পুত"], ["হারামির", "বাচ্চা"],
-            ["khankir", "pola"], ["khankir", "baccha"], ["magir", "pola"], ["magir", "baccha"]
-        ]
-
-        for combo in offensive_combinations:
-            # Check if both parts of the combination exist in the text
-            if all(part.lower() in original_lower or part.lower() in cleaned for part in combo):
-                print(f"Slang detected: Offensive combination '{' '.join(combo)}' found in comment")
-                return True
+        def check():
+            print(f"Cleaned text: '{(normalized or normalize_comment(text))['cleaned']}'")  # Debug log
+            return matcher.check(text, normalized, fuzzy_max_distance, page_overlay, not greeting_checked)
+
+        # Results depend on the lexicon version and page overlay as well as the text
+        key = self.analysis_memo_key(text, matcher.lexicon_version, fuzzy_max_distance,
+                                     page_overlay.fingerprint if page_overlay is not None else None)
+        greeting, detection = self.memoized_analysis("slang", key, check)
+        if greeting:
+            print(f"Greeting detected: '{greeting['greeting']}', skipping slang check")
+            return None
+        if detection:
+            print(f"Slang detected: {detection['rule']} '{detection['term']}' matched {detection['matched']}")
+            return detection
 
         print("No slang detected")
-        return False
+        return None
 
-    def get_sentiment(self, comment):
+    def get_sentiment(self, comment, normalized=None):
+        """Memoized get_sentiment_uncached()."""
+        return self.memoized_analysis("sentiment", self.analysis_memo_key(comment),
+                                      lambda: self.get_sentiment_uncached(comment, normalized))
+
+    def get_sentiment_uncached(self, comment, normalized=None):
         """
         Determines the sentiment of a comment (Positive, Negative, or Neutral)
         based on a predefined list of keywords.
@@ -534,7 +2269,7 @@ class FacebookBot:
         negative_words = ['খারাপ', 'bad', 'terrible', 'awful', 'hate', 'horrible', 'angry', 'disappointed', 'বিরক্ত',
                           'রাগ', 'বাজে', 'জঘন্য', 'সমস্যা', 'বিরক্তিকর', 'bura', 'ganda', 'बुरा', 'गंदा', 'warui',
                           'bu hao']
-        comment_lower = comment.lower()
+        comment_lower = normalized["lower"] if normalized else comment.lower()
         positive_count = sum(1 for word in positive_words if word in comment_lower)
         negative_count = sum(1 for word in negative_words if word in comment_lower)
         if positive_count > negative_count:
@@ -573,6 +2308,17 @@ class FacebookBot:
 
         return True
 
+    def get_greeting_reply(self, greeting, comment_language, commenter_name):
+        """
+        Canned reply to a greeting-only comment: a salam gets its customary answer, any other
+        greeting a greeting in the comment's language (Bengali for mixed or unknown languages).
+        """
+        if "salam" in greeting or "সালাম" in greeting:
+            template = CANNED_GREETING_REPLY_TEMPLATES["salam_latin" if greeting.isascii() else "salam"]
+        else:
+            template = CANNED_GREETING_REPLY_TEMPLATES.get(comment_language, CANNED_GREETING_REPLY_TEMPLATES["bangla"])
+        return template.format(name=commenter_name)
+
     def get_fallback_response(self, comment, sentiment, comment_language, commenter_name):
         """
         Simple universal fallback response - GPT will handle language matching.
@@ -642,10 +2388,140 @@ class FacebookBot:
         # Method 3: Generic fallback
         return "আমাদের কোম্পানি"  # Generic Bengali fallback
 
+    def get_page_overlay(self, page_info):
+        """
+        Compiled PageOverlay for page_info's "blocked_terms" and "allowed_terms" lists, or None
+        if the page has neither. Overlays are cached by their terms, so a page's lists are only
+        compiled again when they change.
+        """
+        blocked_terms = page_info.get("blocked_terms") or []
+        allowed_terms = page_info.get("allowed_terms") or []
+        if not blocked_terms and not allowed_terms:
+            return None
+        if not all(isinstance(terms, list) and all(isinstance(term, str) for term in terms)
+                   for terms in (blocked_terms, allowed_terms)):
+            print(f"Ignoring page overlay for page {page_info.get('page_id')}: "
+                  f"blocked_terms and allowed_terms must be lists of strings")
+            return None
+
+        key = (tuple(sorted(set(blocked_terms))), tuple(sorted(set(allowed_terms))))
+        overlay = self.page_overlay_cache.get(key)
+        if overlay is None:
+            overlay = PageOverlay(blocked_terms, allowed_terms)
+            self.page_overlay_cache.set(key, overlay)
+        return overlay
+
+    def get_prompt_fragments(self, page_info, post_info):
+        """
+        Returns the page and post parts of the prompt: company name, contact information and the
+        PAGE/POST CONTEXT messages. They are cached per page_id/post_id together with a hash of the
+        page name and post content, and rebuilt automatically when either changes.
+        """
+        page_name = page_info.get("page_name", "this page")
+        post_content = post_info.get("post_content", "No specific post content available.")
+        content_hash = hashlib.sha1(f"{page_name}\0{post_content}".encode("utf-8")).hexdigest()
+        cache_key = (page_info.get("page_id", ""), post_info.get("post_id", ""))
+
+        fragments = self.prompt_fragment_cache.get(cache_key)
+        if fragments is not None and fragments["content_hash"] == content_hash:
+            return fragments
+
+        # Extract contact information
+        contact_info = self.extract_contact_info(post_info.get("post_content", ""))
+        website_link = contact_info.get("website")
+        whatsapp_number = contact_info.get("whatsapp")
+        facebook_group_link = contact_info.get("facebook_group")
+
+        # --- DYNAMIC COMPANY NAME EXTRACTION ---
+        company_name_to_use = self.extract_company_name_dynamically(page_info, post_info)
+
+        # Per-page section
+        page_context_message = f"""PAGE CONTEXT:
+- Page: {page_name}
+- Company name: {company_name_to_use} (mention it naturally when relevant and if the user mentions organizations)
+"""
+
+        # Per-post section
+        contact_instructions = []
+        if website_link:
+            contact_instructions.append(f"Website: {website_link}")
+        if whatsapp_number:
+            contact_instructions.append(f"WhatsApp: {whatsapp_number}")
+        if facebook_group_link:
+            contact_instructions.append(f"Facebook Group: {facebook_group_link}")
+
+        post_context_message = f"""POST CONTEXT:
+- Post content: {post_content}
+"""
+        if contact_instructions:
+            post_context_message += f"- Available contact information: {' | '.join(contact_instructions)}. Suggest these if relevant and if user asks for contact info.\n"
+
+        fragments = {
+            "content_hash": content_hash,
+            "page_name": page_name,
+            "company_name": company_name_to_use,
+            "contact_info": contact_info,
+            "page_context_message": page_context_message,
+            "page_context_hash": hashlib.sha1(page_context_message.encode("utf-8")).hexdigest(),
+            "post_context_message": post_context_message
+        }
+        self.prompt_fragment_cache.set(cache_key, fragments)
+        return fragments
+
     def generate_reply(self, json_data):
         """
         Generates a reply to a comment based on the provided JSON data.
         Enhanced with better multi-language support and name consistency using GPT's natural capabilities.
+        Duplicate deliveries of the same comment get the first delivery's reply (see ReplyCoalescer).
+        """
+        key = self.comment_key(json_data)
+        if key is None:
+            return self.generate_reply_once(json_data)
+
+        future, is_leader = self.reply_coalescer.begin(key)
+        if not is_leader:
+            try:
+                response = future.result(timeout=IDEMPOTENCY_WAIT_SECONDS)
+            except FutureTimeoutError:
+                print(f"Duplicate delivery {key} timed out waiting for the first one")
+                response = None
+            return response if response is not None else self.generate_reply_once(json_data)
+        try:
+            response = self.generate_reply_once(json_data)
+        except Exception as e:
+            self.reply_coalescer.finish(key, future, exception=e)
+            raise
+        except BaseException:
+            self.reply_coalescer.abandon(key, future)
+            raise
+        self.reply_coalescer.finish(key, future, response)
+        return response
+
+    def generate_reply_once(self, json_data):
+        """Generates a reply without duplicate coalescing."""
+        early_response, prepared = self.prepare_reply(json_data)
+        if early_response is not None:
+            return early_response
+        return self.complete_reply(prepared)
+
+    def comment_key(self, json_data):
+        """Key identifying a comment across deliveries, or None if the payload has no comment_id."""
+        data = json_data.get("data") if isinstance(json_data, dict) else None
+        if not isinstance(data, dict):
+            return None
+        comment_info = data.get("comment_info") or {}
+        page_info = data.get("page_info") or {}
+        comment_id = comment_info.get("comment_id") if isinstance(comment_info, dict) else None
+        if not comment_id:
+            return None
+        page_id = page_info.get("page_id", "") if isinstance(page_info, dict) else ""
+        return f"{page_id}_{comment_id}"
+
+    def prepare_reply(self, json_data):
+        """
+        Runs the local part of reply generation: comment limits, slang, sentiment, language,
+        name patterns and prompt assembly. Returns (response, None) when no LLM call is needed,
+        otherwise (None, prepared) where `prepared` is passed on to complete_reply().
         """
         start_time = time.time()
         reply_status_code = 200  # Default status code for OK
@@ -660,7 +2536,7 @@ class FacebookBot:
 
         # Return error if comment text is empty
         if not comment_text:
-            return {"error": "Comment text is required", "status_code": 400}
+            return {"error": "Comment text is required", "status_code": 400}, None
 
         # Store context for this specific page and post
         page_id = page_info.get("page_id", "")
@@ -680,8 +2556,8 @@ class FacebookBot:
 
         # --- Check and apply comment limits using the provided limit ---
         if page_id:  # Only apply limit if page_id is available
-            # Check limit BEFORE incrementing count for the current comment
-            if self.is_limit_reached(page_id, provided_comment_limit):
+            # Check limit and count the current comment in one step, so it is counted for *next* requests
+            if not self.reserve_comment_slot(page_id, comment_id, provided_comment_limit):
                 print(f"Comment limit reached for page_id: {page_id}. No reply generated.")
                 reply_status_code = 555  # Custom status for limit reached
                 limit_reply = ""  # No reply generated
@@ -696,13 +2572,22 @@ class FacebookBot:
                     "page_name": page_info.get("page_name", ""),
                     "post_id": post_id,
                     "note": f"Comment limit of {provided_comment_limit} reached for this page. Current count: {self.get_comment_count(page_id)}. No reply generated due to limit."
-                }
-
-            # Increment count AFTER the limit check, so the current comment is counted for *next* requests
-            self.increment_comment_count(page_id, comment_id)
+                }, None
 
         # --- Slang Detection ---
-        slang_detected = self.contains_slang(comment_text)
+        # Normalize once; slang, sentiment, language and name analysis all share the result
+        normalized_text = normalize_comment(comment_text)
+
+        # Greetings are never slang, so a comment with one skips the slang matcher altogether
+        greeting = self.slang_matcher.greeting_matcher.classify(normalized_text["lower"].strip())
+        greeting_only = bool(greeting and greeting["greeting_only"])
+        if greeting:
+            print(f"Greeting detected: '{greeting['greeting']}' (greeting only: {greeting_only}), skipping slang check")
+            slang_match = None
+        else:
+            slang_match = self.find_slang(comment_text, normalized_text,
+                                          page_overlay=self.get_page_overlay(page_info), greeting_checked=True)
+        slang_detected = slang_match is not None
         if slang_detected:
             reply = ""  # No reply for actual offensive slang
             sentiment = "Negative"  # Assign negative sentiment for slang comments
@@ -722,261 +2607,874 @@ class FacebookBot:
                 "response_time": response_time,
                 "sentiment": sentiment,
                 "slang_detected": True,
+                "slang_match": slang_match,  # rule, term and spans, for moderators auditing the decision
+                "lexicon_version": self.lexicon_version,
                 "status_code": 200
-            }
+            }, None
 
         # --- Sentiment and Language Detection ---
-        sentiment = self.get_sentiment(comment_text)
-        comment_language = self.detect_comment_language(comment_text)
+        sentiment = self.get_sentiment(comment_text, normalized_text)
+        comment_language = self.detect_comment_language(comment_text, normalized_text)
         commenter_name = comment_info.get("commenter_name", "User")  # Default to "User" if name is missing
 
-        # Extract contact information
-        contact_info = self.extract_contact_info(post_info.get("post_content", ""))
-        website_link = contact_info.get("website")
-        whatsapp_number = contact_info.get("whatsapp")
-        facebook_group_link = contact_info.get("facebook_group")
-
-        # --- DYNAMIC COMPANY NAME EXTRACTION ---
-        company_name_to_use = self.extract_company_name_dynamically(page_info, post_info)
-        page_name = page_info.get("page_name", "this page")
+        # A greeting-only comment needs no prompt or LLM call: answer it with a canned greeting
+        if greeting_only and CANNED_GREETING_REPLIES:
+            self.add_comment_history(page_id, post_id, comment_info)
+            return {
+                "comment_id": comment_id,
+                "commenter_name": commenter_name,
+                "controlled": True,
+                "input_tokens": 0,
+                "note": "Greeting-only comment. Canned greeting reply, no LLM call.",
+                "output_tokens": 0,
+                "page_name": page_info.get("page_name", ""),
+                "post_id": post_id,
+                "reply": self.get_greeting_reply(greeting["greeting"], comment_language, commenter_name),
+                "response_time": f"{time.time() - start_time:.2f}s",
+                "sentiment": sentiment,
+                "slang_detected": False,
+                "lexicon_version": self.lexicon_version,
+                "comment_language": comment_language,
+                "status_code": reply_status_code,
+                "greeting_only": True
+            }, None
+
+        # Page and post parts of the prompt (company name, contact info) only change with the post
+        prompt_fragments = self.get_prompt_fragments(page_info, post_info)
+        company_name_to_use = prompt_fragments["company_name"]
+        page_name = prompt_fragments["page_name"]
 
         # --- NEW: ANALYZE NAME PATTERNS ---
         name_patterns = self.analyze_name_patterns(
             comment_text,
             commenter_name,
             page_name,
-            company_name_to_use
+            company_name_to_use,
+            normalized_text
         )
 
         print(f"Dynamically extracted company name: '{company_name_to_use}'")  # Debug log
 
         # --- Prepare for LLM Request ---
-        messages = []
-
-        # Enhanced System prompt with MANDATORY commenter name inclusion
-        system_prompt = f"""
-        You are an AI assistant for {company_name_to_use}'s Facebook page.
-        Your goal is to provide concise, helpful, and friendly replies to comments.
-
-        CRITICAL COMMENTER NAME RULE:
-        - You MUST start your reply by addressing the commenter by their name: {commenter_name}
-        - ALWAYS begin your response with "{commenter_name}," or "{commenter_name} ভাই/আপা" for Bengali
-        - This is MANDATORY - every reply must include the commenter's name at the beginning
-
-        CRITICAL LANGUAGE RULE: 
-        - You MUST respond in the SAME language as the user's comment
-        - If they write in Bengali/Bangla → Reply ONLY in Bengali/Bangla (বাংলা)
-        - If they write in English → Reply ONLY in English
-        - If they write in Hindi → Reply ONLY in Hindi (हिंदी)
-        - If they write in Chinese → Reply ONLY in Chinese (中文)
-        - If they write in Japanese → Reply ONLY in Japanese (日本語)
-        - If they write in Arabic → Reply ONLY in Arabic (العربية)
-        - If mixed languages → Use the predominant language or Bengali as fallback
-
-        CRITICAL NAME CONSISTENCY RULES:
-        - Analyze HOW names are mentioned in the user's comment
-        - If user uses formal address (আপনি/sir/madam): Use formal address in reply
-        - If user uses informal address (তুমি/you): Use informal address in reply
-        - If user mentions company/page name: Mention it similarly in reply
-        - If user uses honorifics (জনাব/mr./dr.): Use appropriate honorifics in reply
-        - If user is casual with names: Be casual in reply
-        - If user is formal with names: Be formal in reply
-        - MATCH the user's style of addressing people and organizations
-
-        NAME PATTERN ANALYSIS FROM COMMENT:
-        - Mentions commenter name: {name_patterns['mentions_commenter_name']}
-        - Mentions page name: {name_patterns['mentions_page_name']}
-        - Mentions company name: {name_patterns['mentions_company_name']}
-        - Uses formal address: {name_patterns['formal_address']}
-        - Uses informal address: {name_patterns['informal_address']}
-        - Uses honorifics: {name_patterns['uses_honorifics']}
-        - Overall name style: {name_patterns['name_style']}
-
-        RESPONSE GUIDELINES:
-        - ALWAYS start with the commenter's name: {commenter_name}
-        - Keep replies very short: 1-2 sentences maximum
-        - Be friendly, helpful, and professional
-        - Mention the company name '{company_name_to_use}' naturally when relevant and if user mentions organizations
-        - Use appropriate emojis for the culture and language
-        - For negative feedback: acknowledge, apologize if needed, direct to inbox
-        - For positive feedback: thank warmly and show appreciation
-        - For questions: answer briefly or direct to contact information
-        - MAINTAIN THE SAME LEVEL OF FORMALITY as the user's comment
-
-        CULTURAL SENSITIVITY:
-        - Use culturally appropriate greetings and expressions
-        - Respect local customs and communication styles
-        - Use formal/informal tone as appropriate for the language AND user's style
-
-        EXAMPLES:
-        - If comment is in English: "{commenter_name}, thank you for your comment! 😊"
-        - If comment is in Bengali: "{commenter_name}, আপনার মন্তব্যের জন্য ধন্যবাদ! 😊"
-        - If comment is in Hindi: "{commenter_name}, आपकी टिप्पणी के लिए धन्यवाद! 😊"
-
-        Current date and time: {datetime.now().strftime("%Y-%m-%d %H:%M")}
-        """
-        messages.append({"role": "system", "content": system_prompt})
-
-        # Add page and post context
-        post_content = post_info.get("post_content", "No specific post content available.")
-
-        context_message = f"""
-        Context Information:
-        - Page: {page_name}
-        - Post content: {post_content}
-        - Detected comment language: {comment_language}
-        - Comment sentiment: {sentiment}
-        - User's naming style: {name_patterns['name_style']}
-        - IMPORTANT: MUST address the commenter as: {commenter_name}
-        """
-        messages.append({"role": "user", "content": context_message})
-
-        # Add previous comments for context (if any)
-        context_key = f"{page_id}_{post_id}"
-        if context_key in self.previous_comments:
-            recent_comments = []
-            for prev_comment in self.previous_comments[context_key][-3:]:  # Last 3 comments for context
-                recent_comments.append(f"{prev_comment['commenter_name']}: {prev_comment['comment_text']}")
-            if recent_comments:
-                messages.append(
-                    {"role": "user", "content": f"Recent comments for context: {' | '.join(recent_comments)}"})
-
-        # Add the current comment with naming analysis
-        current_comment_message = f"""
-        Current comment from {commenter_name}: "{comment_text}"
-
-        IMPORTANT: 
-        1. START your reply with "{commenter_name}," - this is MANDATORY
-        2. Respond in the SAME language as this comment ({comment_language})
-        3. Match the user's style of addressing names and organizations
-        4. If user is formal, be formal. If user is casual, be casual.
-        5. Use the same level of respect/honorifics as the user
-        """
+        # Ordered from most to least shared: the static rules are byte-identical for every request,
+        # then page, post and comment sections, so provider-side prompt caching can reuse the prefix.
+        messages = [{"role": "system", "content": STATIC_SYSTEM_PROMPT}]
+
+        messages.append({"role": "user", "content": prompt_fragments["page_context_message"]})
+
+        # A reply shared across the page's posts must not depend on any one post
+        share_page_wide = greeting_only and GREETING_REPLIES_PAGE_WIDE
+        if not share_page_wide:
+            messages.append({"role": "user", "content": prompt_fragments["post_context_message"]})
+
+            # Add previous comments for context (if any)
+            recent_history = self.get_recent_comments(page_id, post_id, 3)  # Last 3 comments for context
+            if recent_history:
+                recent_comments = []
+                for prev_comment in recent_history:
+                    recent_comments.append(f"{prev_comment['commenter_name']}: {prev_comment['comment_text']}")
+                if recent_comments:
+                    messages.append(
+                        {"role": "user", "content": f"Recent comments for context: {' | '.join(recent_comments)}"})
+
+        # Per-comment section: commenter name, name pattern analysis and the comment itself
+        current_comment_message = f"""COMMENT CONTEXT:
+- Commenter name: {commenter_name} (start your reply with "{commenter_name}," or "{commenter_name} ভাই/আপা" for Bengali)
+- Detected comment language: {comment_language}
+- Comment sentiment: {sentiment}
+- Mentions commenter name: {name_patterns['mentions_commenter_name']}
+- Mentions page name: {name_patterns['mentions_page_name']}
+- Mentions company name: {name_patterns['mentions_company_name']}
+- Uses formal address: {name_patterns['formal_address']}
+- Uses informal address: {name_patterns['informal_address']}
+- Uses honorifics: {name_patterns['uses_honorifics']}
+- Overall name style: {name_patterns['name_style']}
+- Current date and time: {datetime.now().strftime("%Y-%m-%d %H:%M")}
+
+Current comment from {commenter_name}: "{comment_text}"
+
+IMPORTANT:
+1. START your reply with "{commenter_name}," - this is MANDATORY
+2. Respond in the SAME language as this comment ({comment_language})
+3. Match the user's style of addressing names and organizations
+4. If user is formal, be formal. If user is casual, be casual.
+5. Use the same level of respect/honorifics as the user
+"""
         messages.append({"role": "user", "content": current_comment_message})
 
-        # Add contact information if available
-        contact_instructions = []
-        if website_link:
-            contact_instructions.append(f"Website: {website_link}")
-        if whatsapp_number:
-            contact_instructions.append(f"WhatsApp: {whatsapp_number}")
-        if facebook_group_link:
-            contact_instructions.append(f"Facebook Group: {facebook_group_link}")
-
-        if contact_instructions:
-            messages.append({"role": "user",
-                             "content": f"Available contact information: {' | '.join(contact_instructions)}. Suggest these if relevant and if user asks for contact info."})
-
         # Calculate input tokens before the API call
         input_tokens = self.count_tokens(" ".join([m["content"] for m in messages]))
 
+        normalized_comment = self.normalize_for_reply_cache(comment_text)
+        # The content hash keeps replies from outliving a post edit (new price, new contact details)
+        if share_page_wide:
+            cache_scope, content_hash = GREETING_REPLY_SCOPE, prompt_fragments["page_context_hash"]
+        else:
+            cache_scope, content_hash = post_id, prompt_fragments["content_hash"]
+        reply_cache_key = (page_id, cache_scope, content_hash, normalized_comment,
+                           comment_language, name_patterns["name_style"])
+
+        return None, {
+            "start_time": start_time,
+            "reply_status_code": reply_status_code,
+            "messages": messages,
+            "input_tokens": input_tokens,
+            "reply_cache_key": reply_cache_key,
+            "normalized_comment": normalized_comment,
+            "page_id": page_id,
+            "post_id": post_id,
+            "comment_id": comment_id,
+            "page_info": page_info,
+            "comment_info": comment_info,
+            "comment_text": comment_text,
+            "commenter_name": commenter_name,
+            "sentiment": sentiment,
+            "comment_language": comment_language,
+            "slang_detected": slang_detected,
+            "company_name_to_use": company_name_to_use,
+            "name_patterns": name_patterns,
+            "greeting_only": greeting_only
+        }
+
+    def build_llm_payload(self, messages):
+        """Builds the OpenRouter chat completion request body."""
+        return {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": 150,  # Slightly increased for multi-language support
+            "temperature": 0.7,
+            "top_p": 0.9,
+            "stop": ["\n\n", "Commenter:", "User:", "Context:"]
+        }
+
+    def complete_reply(self, prepared):
+        """
+        Sends a prepared comment to the LLM and builds the final response, falling back
+        to a canned reply if the API call fails or the reply does not pass validation.
+        """
+        outcome = self.get_cached_outcome(prepared)
+        if outcome is not None:
+            return self.finish_reply(prepared, outcome)
+
         # --- Call OpenRouter GPT-4o-mini API ---
         try:
-            payload = {
-                "model": self.model,
-                "messages": messages,
-                "max_tokens": 150,  # Slightly increased for multi-language support
-                "temperature": 0.7,
-                "top_p": 0.9,
-                "stop": ["\n\n", "Commenter:", "User:", "Context:"]
-            }
-            response = requests.post(self.base_url, headers=self.headers, json=payload, timeout=15)
-
-            # Handle specific HTTP errors
-            if response.status_code == 402:
-                print(
-                    "Payment Required: Insufficient credits or no payment method. Please add credits to your account.")
-                reply = self.get_fallback_response(comment_text, sentiment, comment_language, commenter_name)
-                note = "Payment Required: Insufficient API credits. Using fallback."
-                controlled_status = True
-                output_tokens = 0
-            elif response.status_code == 401:
-                print("Unauthorized: Invalid API key. Please check your API key.")
-                reply = self.get_fallback_response(comment_text, sentiment, comment_language, commenter_name)
-                note = "Unauthorized: Invalid API key. Using fallback."
-                controlled_status = True
-                output_tokens = 0
-            elif response.status_code == 429:
-                print("Rate Limited: Too many requests. Please wait and try again.")
-                reply = self.get_fallback_response(comment_text, sentiment, comment_language, commenter_name)
-                note = "Rate Limited: Too many requests. Using fallback."
-                controlled_status = True
-                output_tokens = 0
-            else:
+            payload = self.build_llm_payload(prepared["messages"])
+            response = self.session.post(self.base_url, headers=self.headers, json=payload, timeout=15)
+            if response.status_code not in (401, 402, 429):
                 response.raise_for_status()  # Raise an exception for other HTTP errors
-                llm_response_json = response.json()
-                llm_reply = llm_response_json["choices"][0]["message"]["content"].strip()
-                output_tokens = self.count_tokens(llm_reply)
-
-                # Post-process LLM reply - ensure commenter name is at the beginning
-                print(f"Original LLM Response: '{llm_reply}'")  # Debug log
-
-                # Check if the reply starts with the commenter's name, if not, add it
-                if not llm_reply.lower().startswith(commenter_name.lower()):
-                    # Determine language and add appropriate format
-                    if comment_language == "bangla":
-                        llm_reply = f"{commenter_name}, {llm_reply}"
-                    else:
-                        llm_reply = f"{commenter_name}, {llm_reply}"
-
-                # Validate LLM response
-                print(f"Processed LLM Response: '{llm_reply}'")  # Debug log
-                print(f"Response word count: {len(llm_reply.split())}")  # Debug log
-
-                if not self.validate_response(llm_reply, comment_text):
-                    # Log why validation failed
-                    print(f"Validation failed for response: '{llm_reply}'")
-                    reply = self.get_fallback_response(comment_text, sentiment, comment_language, commenter_name)
-                    note = f"LLM response rejected by validation: '{llm_reply[:50]}...'. Using fallback."
-                    controlled_status = True
-                else:
-                    reply = llm_reply
-                    note = ""
-                    controlled_status = False
-
+            outcome = self.handle_llm_response(prepared, response.status_code, response.json)
         except requests.exceptions.RequestException as e:
             print(f"API request failed: {e}")
-            reply = self.get_fallback_response(comment_text, sentiment, comment_language, commenter_name)
-            note = f"API request failed: {e}. Using fallback."
-            controlled_status = True
-            output_tokens = 0  # No output tokens if API call failed
+            outcome = self.fallback_outcome(prepared, f"API request failed: {e}. Using fallback.")
         except KeyError as e:
-            print(
-                f"Failed to parse LLM response: {e}. Response: {llm_response_json if 'llm_response_json' in locals() else 'No response'}")
-            reply = self.get_fallback_response(comment_text, sentiment, comment_language, commenter_name)
-            note = f"Failed to parse LLM response: {e}. Using fallback."
-            controlled_status = True
-            output_tokens = 0  # No output tokens if parsing failed
+            print(f"Failed to parse LLM response: {e}")
+            outcome = self.fallback_outcome(prepared, f"Failed to parse LLM response: {e}. Using fallback.")
         except Exception as e:
             print(f"An unexpected error occurred during LLM reply generation: {e}")
-            reply = self.get_fallback_response(comment_text, sentiment, comment_language, commenter_name)
-            note = f"Unexpected error: {e}. Using fallback."
-            controlled_status = True
-            output_tokens = 0  # No output tokens if an unexpected error occurred
+            outcome = self.fallback_outcome(prepared, f"Unexpected error: {e}. Using fallback.")
+
+        self.store_cached_outcome(prepared, outcome)
+        return self.finish_reply(prepared, outcome)
+
+    # --- Reply Cache ---
+    def normalize_for_reply_cache(self, comment_text):
+        """Lowercases, collapses whitespace and trims edge punctuation so "Price?" and "price" share a key."""
+        return " ".join(comment_text.lower().split()).strip(" ?!.,;:।")
+
+    def get_cached_outcome(self, prepared):
+        """
+        Returns an LLM outcome for an identical (or near-identical) earlier comment, personalized
+        with the current commenter's name, or None on a miss.
+        """
+        cache_key = prepared["reply_cache_key"]
+        cached = self.reply_cache.get(cache_key)
+        cache_type = "exact"
+        if cached is None:
+            near_match = self.near_duplicate_cache.lookup(self.near_duplicate_scope(cache_key),
+                                                          prepared["normalized_comment"])
+            if near_match is None:
+                return None
+            similarity, cached = near_match
+            cache_type = f"near_duplicate ({similarity:.2f})"
+
+        tokens_saved = prepared["input_tokens"] + cached["output_tokens"]
+        with self.state_lock:
+            self.tokens_saved += tokens_saved
+        print(f"Reply cache hit ({cache_type}) for '{prepared['comment_text']}', saved {tokens_saved} tokens")  # Debug log
+        return {
+            "reply": f"{prepared['commenter_name']}{cached['reply_body']}",
+            "note": "",
+            "controlled": False,
+            "output_tokens": 0,
+            "cache_hit": True,
+            "cache_type": cache_type.split(" ")[0],
+            "tokens_saved": tokens_saved
+        }
+
+    def near_duplicate_scope(self, cache_key):
+        """Near duplicates are only reused within the same post (and post content), language and name style."""
+        page_id, post_id, content_hash, _, comment_language, name_style = cache_key
+        return page_id, post_id, content_hash, comment_language, name_style
+
+    def store_cached_outcome(self, prepared, outcome):
+        """Caches a successful LLM reply with the commenter's name stripped from the front."""
+        commenter_name = prepared["commenter_name"]
+        reply = outcome["reply"]
+        if outcome["controlled"] or not reply.lower().startswith(commenter_name.lower()):
+            return
+        cached = {
+            "reply_body": reply[len(commenter_name):],
+            "output_tokens": outcome["output_tokens"]
+        }
+        self.reply_cache.set(prepared["reply_cache_key"], cached)
+        self.near_duplicate_cache.add(self.near_duplicate_scope(prepared["reply_cache_key"]),
+                                      prepared["normalized_comment"], cached)
+
+    def fallback_outcome(self, prepared, note):
+        """LLM outcome used whenever the API call or its reply can't be used."""
+        reply = self.get_fallback_response(prepared["comment_text"], prepared["sentiment"],
+                                           prepared["comment_language"], prepared["commenter_name"])
+        return {"reply": reply, "note": note, "controlled": True, "output_tokens": 0}
+
+    def handle_llm_response(self, prepared, status_code, get_json):
+        """
+        Turns an OpenRouter response into a reply outcome. Shared by the sync and async paths;
+        `get_json` is called lazily so error responses are never parsed.
+        """
+        comment_text = prepared["comment_text"]
+        commenter_name = prepared["commenter_name"]
+        comment_language = prepared["comment_language"]
+
+        # Handle specific HTTP errors
+        if status_code == 402:
+            print("Payment Required: Insufficient credits or no payment method. Please add credits to your account.")
+            return self.fallback_outcome(prepared, "Payment Required: Insufficient API credits. Using fallback.")
+        if status_code == 401:
+            print("Unauthorized: Invalid API key. Please check your API key.")
+            return self.fallback_outcome(prepared, "Unauthorized: Invalid API key. Using fallback.")
+        if status_code == 429:
+            print("Rate Limited: Too many requests. Please wait and try again.")
+            return self.fallback_outcome(prepared, "Rate Limited: Too many requests. Using fallback.")
+
+        llm_response_json = get_json()
+        llm_reply = llm_response_json["choices"][0]["message"]["content"].strip()
+        output_tokens = self.count_tokens(llm_reply)
+
+        # Post-process LLM reply - ensure commenter name is at the beginning
+        print(f"Original LLM Response: '{llm_reply}'")  # Debug log
+
+        # Check if the reply starts with the commenter's name, if not, add it
+        if not llm_reply.lower().startswith(commenter_name.lower()):
+            llm_reply = f"{commenter_name}, {llm_reply}"
+
+        # Validate LLM response
+        print(f"Processed LLM Response: '{llm_reply}'")  # Debug log
+        print(f"Response word count: {len(llm_reply.split())}")  # Debug log
+
+        if not self.validate_response(llm_reply, comment_text):
+            # Log why validation failed
+            print(f"Validation failed for response: '{llm_reply}'")
+            outcome = self.fallback_outcome(
+                prepared, f"LLM response rejected by validation: '{llm_reply[:50]}...'. Using fallback.")
+            outcome["output_tokens"] = output_tokens
+            outcome.update(self.get_usage_stats(llm_response_json))
+            return outcome
+
+        outcome = {"reply": llm_reply, "note": "", "controlled": False, "output_tokens": output_tokens}
+        outcome.update(self.get_usage_stats(llm_response_json))
+        return outcome
+
+    def get_usage_stats(self, llm_response_json):
+        """
+        Reads token usage reported by the provider, including how much of the prompt was
+        served from its prompt cache (usage.prompt_tokens_details.cached_tokens).
+        """
+        usage = llm_response_json.get("usage") or {}
+        prompt_details = usage.get("prompt_tokens_details") or {}
+        cached_tokens = prompt_details.get("cached_tokens", usage.get("cached_tokens", 0)) or 0
+        if cached_tokens:
+            print(f"Provider prompt cache: {cached_tokens}/{usage.get('prompt_tokens', 0)} input tokens cached")  # Debug log
+        return {
+            "provider_input_tokens": usage.get("prompt_tokens"),
+            "cached_input_tokens": cached_tokens
+        }
+
+    def finish_reply(self, prepared, outcome):
+        """Records the comment in the post history and builds the /process-comment response."""
+        page_info = prepared["page_info"]
 
         # Add comment to history after successful processing or fallback
-        self.add_comment_history(page_id, post_id, comment_info)
+        self.add_comment_history(prepared["page_id"], prepared["post_id"], prepared["comment_info"])
 
-        response_time = f"{time.time() - start_time:.2f}s"
+        response_time = f"{time.time() - prepared['start_time']:.2f}s"
 
         return {
-            "comment_id": comment_id,
-            "commenter_name": commenter_name,
-            "controlled": controlled_status,
-            "input_tokens": input_tokens,
-            "note": note,
-            "output_tokens": output_tokens,
+            "comment_id": prepared["comment_id"],
+            "commenter_name": prepared["commenter_name"],
+            "controlled": outcome["controlled"],
+            "input_tokens": 0 if outcome.get("cache_hit") else prepared["input_tokens"],
+            "note": outcome["note"],
+            "output_tokens": outcome["output_tokens"],
             "page_name": page_info.get("page_name", ""),
-            "post_id": post_id,
-            "reply": reply,
+            "post_id": prepared["post_id"],
+            "reply": outcome["reply"],
             "response_time": response_time,
-            "sentiment": sentiment,
-            "slang_detected": slang_detected,
-            "comment_language": comment_language,  # Added language detection result
-            "status_code": reply_status_code,
-            "company_name_used": company_name_to_use,  # Added to show which company name was used
-            "name_patterns_detected": name_patterns  # Added to show detected naming patterns
+            "sentiment": prepared["sentiment"],
+            "slang_detected": prepared["slang_detected"],
+            "lexicon_version": self.lexicon_version,
+            "comment_language": prepared["comment_language"],  # Added language detection result
+            "status_code": prepared["reply_status_code"],
+            "company_name_used": prepared["company_name_to_use"],  # Added to show which company name was used
+            "name_patterns_detected": prepared["name_patterns"],  # Added to show detected naming patterns
+            "greeting_only": prepared["greeting_only"],
+            "cached_input_tokens": outcome.get("cached_input_tokens", 0),
+            "cache_hit": outcome.get("cache_hit", False),
+            "cache_type": outcome.get("cache_type"),
+            "tokens_saved": outcome.get("tokens_saved", 0)
+        }
+
+    # --- Asyncio serving path ---
+    async def generate_reply_async(self, json_data, client):
+        """
+        Async variant of generate_reply(). The local analysis stays synchronous (it is fast
+        and CPU-bound); only the OpenRouter call is awaited on the given httpx.AsyncClient.
+        """
+        key = self.comment_key(json_data)
+        if key is not None:
+            future, is_leader = self.reply_coalescer.begin(key)
+            if not is_leader:
+                try:
+                    response = await asyncio.wait_for(asyncio.wrap_future(future), IDEMPOTENCY_WAIT_SECONDS)
+                except asyncio.TimeoutError:
+                    print(f"Duplicate delivery {key} timed out waiting for the first one")
+                    response = None
+                if response is not None:
+                    return response
+                key = None  # Generate our own reply, outside coalescing
+
+        try:
+            early_response, prepared = self.prepare_reply(json_data)
+            if early_response is not None:
+                response = early_response
+            else:
+                response = await self.complete_reply_async(prepared, client)
+        except Exception as e:
+            if key is not None:
+                self.reply_coalescer.finish(key, future, exception=e)
+            raise
+        except BaseException:
+            # Cancelled (client disconnect, timeout, shutdown): free the key for the next delivery
+            if key is not None:
+                self.reply_coalescer.abandon(key, future)
+            raise
+        if key is not None:
+            self.reply_coalescer.finish(key, future, response)
+        return response
+
+    async def complete_reply_async(self, prepared, client):
+        """Async variant of complete_reply()."""
+        outcome = self.get_cached_outcome(prepared)
+        if outcome is not None:
+            return self.finish_reply(prepared, outcome)
+
+        try:
+            payload = self.build_llm_payload(prepared["messages"])
+            response = await client.post(self.base_url, headers=self.headers, json=payload, timeout=15)
+            if response.status_code not in (401, 402, 429):
+                response.raise_for_status()
+            outcome = self.handle_llm_response(prepared, response.status_code, response.json)
+        except httpx.HTTPError as e:
+            print(f"API request failed: {e}")
+            outcome = self.fallback_outcome(prepared, f"API request failed: {e}. Using fallback.")
+        except KeyError as e:
+            print(f"Failed to parse LLM response: {e}")
+            outcome = self.fallback_outcome(prepared, f"Failed to parse LLM response: {e}. Using fallback.")
+        except Exception as e:
+            print(f"An unexpected error occurred during LLM reply generation: {e}")
+            outcome = self.fallback_outcome(prepared, f"Unexpected error: {e}. Using fallback.")
+
+        self.store_cached_outcome(prepared, outcome)
+        return self.finish_reply(prepared, outcome)
+
+    # --- Batch Processing ---
+    def submit_batch_item(self, index, json_data, executor):
+        """
+        Starts one batch item and returns a Future for its response. Local analysis runs right
+        away and only comments that need the LLM are queued on `executor`. Duplicates of a
+        comment that is already in flight (or was just answered) reuse that reply.
+        """
+        key = self.comment_key(json_data)
+        if key is not None:
+            leader_future, is_leader = self.reply_coalescer.begin(key)
+            if not is_leader:
+                return self.follow_batch_leader(leader_future, json_data, executor)
+
+        error = comment_payload_error(json_data)
+        try:
+            if error:
+                early_response, prepared = {"error": error, "status_code": 400}, None
+            else:
+                early_response, prepared = self.prepare_reply(json_data)
+        except Exception as e:
+            print(f"Failed to prepare batch item {index}: {e}")
+            early_response, prepared = {"error": f"Invalid comment payload: {e}", "status_code": 400}, None
+
+        if early_response is not None:
+            future = Future()
+            future.set_result(early_response)
+        else:
+            future = executor.submit(self.complete_reply, prepared)
+
+        if key is not None:
+            def settle(done):
+                if done.cancelled():
+                    self.reply_coalescer.abandon(key, leader_future)
+                elif done.exception() is not None:
+                    self.reply_coalescer.finish(key, leader_future, exception=done.exception())
+                else:
+                    self.reply_coalescer.finish(key, leader_future, done.result())
+
+            future.add_done_callback(settle)
+        return future
+
+    def follow_batch_leader(self, waiter, json_data, executor):
+        """
+        Future for a batch duplicate of a comment that is in flight: the leader's reply, or a
+        reply of its own (queued on `executor`) if the leader was abandoned.
+        """
+        result = Future()
+
+        def relay(done):
+            if result.cancelled():
+                return
+            try:
+                if done.exception() is not None:
+                    result.set_exception(done.exception())
+                elif done.result() is not None:
+                    result.set_result(done.result())
+                else:
+                    executor.submit(self.generate_reply_once, json_data).add_done_callback(relay)
+            except InvalidStateError:
+                pass  # Cancelled in the meantime
+
+        waiter.add_done_callback(relay)
+        return result
+
+    def collect_batch_item(self, index, future):
+        """Returns the finished response for a batch item, tagged with its input position."""
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"Batch item {index} failed: {e}")
+            result = {"error": f"Unexpected error: {e}", "status_code": 500}
+        result["index"] = index
+        result.setdefault("status_code", 200)
+        return result
+
+    def generate_replies(self, payloads, executor):
+        """
+        Generates replies for a list of /process-comment payloads.
+        Local analysis runs for the whole batch first, then only the comments that need
+        the LLM are submitted to `executor`. Results come back in input order.
+        """
+        futures = [self.submit_batch_item(index, json_data, executor) for index, json_data in enumerate(payloads)]
+        return [self.collect_batch_item(index, future) for index, future in enumerate(futures)]
+
+    def iter_replies(self, payloads, executor, max_in_flight):
+        """
+        Streaming variant of generate_replies(): yields each result as soon as it is ready,
+        in completion order and tagged with its input index. At most `max_in_flight` items
+        are pending at a time, so memory stays flat regardless of batch size.
+        """
+        in_flight = {}
+        try:
+            for index, json_data in enumerate(payloads):
+                in_flight[self.submit_batch_item(index, json_data, executor)] = index
+                if len(in_flight) >= max_in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield self.collect_batch_item(in_flight.pop(future), future)
+
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield self.collect_batch_item(in_flight.pop(future), future)
+        finally:
+            # The consumer went away mid-stream: drop LLM calls that have not started yet
+            for future in in_flight:
+                future.cancel()
+
+
+# --- Shared LLM worker pool ---
+# Bounds how many OpenRouter calls the batch endpoints keep in flight at once, across all requests
+LLM_MAX_WORKERS = int(os.getenv("LLM_MAX_WORKERS", "16"))
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "5000"))
+llm_executor = ThreadPoolExecutor(max_workers=LLM_MAX_WORKERS, thread_name_prefix="llm")
+
+
+# --- Application-scoped bot ---
+# Building a FacebookBot loads the tokenizer and runs the slang self-test, and the bot holds
+# the comment counts and history, so one instance is shared by every request thread.
+_bot = None
+_bot_lock = threading.Lock()
+
+
+def get_bot():
+    """Returns the shared FacebookBot, creating it on first use."""
+    global _bot
+    if _bot is None:
+        with _bot_lock:
+            if _bot is None:
+                _bot = FacebookBot()
+                if UPSTREAM_WARMUP_CONNECTIONS > 0:
+                    threading.Thread(target=warm_up_http_session,
+                                     args=(_bot.session, _bot.base_url, UPSTREAM_WARMUP_CONNECTIONS),
+                                     daemon=True).start()
+                if SLANG_LEXICON_POLL_SECONDS > 0:
+                    LexiconWatcher(_bot, SLANG_LEXICON_PATH, SLANG_LEXICON_POLL_SECONDS).start()
+                start_bulk_moderation_pool(_bot.lexicon)
+    return _bot
+
+
+# --- Bulk moderation ---
+# Moderates a page's whole comment history (backfills) without generating replies. Large inputs
+# are checked in chunks across one long-lived process pool; every worker loads the live lexicon
+# with load_slang_matcher() (mapping the shared artifact), so results are exactly what
+# contains_slang() says online.
+BULK_MODERATION_WORKERS = int(os.getenv("BULK_MODERATION_WORKERS", str(os.cpu_count() or 1)))
+BULK_MODERATION_CHUNK_SIZE = int(os.getenv("BULK_MODERATION_CHUNK_SIZE", "2000"))
+BULK_MODERATION_MIN_POOL_COMMENTS = int(os.getenv("BULK_MODERATION_MIN_POOL_COMMENTS", "50000"))
+MAX_BULK_MODERATION_COMMENTS = int(os.getenv("MAX_BULK_MODERATION_COMMENTS", "500000"))
+
+# Created by start_bulk_moderation_pool() when the bot is built
+bulk_moderation_pool = None
+_bulk_pool_lock = threading.Lock()
+
+# Set in each pool worker by get_bulk_worker_matcher()
+_bulk_matcher = None
+
+
+def start_bulk_moderation_pool(lexicon, workers=BULK_MODERATION_WORKERS):
+    """
+    Creates the shared bulk moderation pool and has its workers load the lexicon in the
+    background. The workers are started with forkserver (spawn where that is unavailable):
+    forking this multithreaded process could copy a lock another thread is holding.
+    """
+    global bulk_moderation_pool
+    with _bulk_pool_lock:
+        if bulk_moderation_pool is None and workers > 1:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            bulk_moderation_pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            version = get_lexicon_version(lexicon)
+            for _ in range(workers):
+                bulk_moderation_pool.submit(get_bulk_worker_matcher, lexicon, version)
+    return bulk_moderation_pool
+
+
+def get_bulk_worker_matcher(lexicon, version):
+    """Returns this pool worker's SlangMatcher for the lexicon, loading it on a version change."""
+    global _bulk_matcher
+    if _bulk_matcher is None or _bulk_matcher.lexicon_version != version:
+        matcher, version = load_slang_matcher(lexicon)
+        matcher.lexicon_version = version
+        _bulk_matcher = matcher
+    return _bulk_matcher
+
+
+def moderate_chunk(comments, matcher, overlay=None):
+    """Returns (rule, term) for each flagged comment in the chunk and None for the rest."""
+    results = []
+    for comment in comments:
+        _, match = matcher.check(comment, overlay=overlay)
+        results.append((match["rule"], match["term"]) if match else None)
+    return results
+
+
+def moderate_chunk_in_worker(comments, lexicon, version, overlay=None):
+    return moderate_chunk(comments, get_bulk_worker_matcher(lexicon, version), overlay)
+
+
+def moderate_comments(comments, matcher, overlay=None, pool=None, workers=BULK_MODERATION_WORKERS,
+                      chunk_size=BULK_MODERATION_CHUNK_SIZE, min_pool_comments=BULK_MODERATION_MIN_POOL_COMMENTS):
+    """
+    Moderates a list of comment texts with the given SlangMatcher (and page overlay).
+    Returns column arrays in input order - flags (0/1), the rule and lexicon term of each
+    match (None if clean) - plus throughput figures. Only inputs of at least min_pool_comments
+    go to the pool (shipping chunks to workers costs more than it saves on smaller ones), and
+    only for a matcher made live by apply_lexicon(), which the workers can rebuild.
+    """
+    start = time.perf_counter()
+    lexicon = getattr(matcher, "lexicon", None)
+    if pool is None or lexicon is None or len(comments) < min_pool_comments:
+        workers = 1
+        results = moderate_chunk(comments, matcher, overlay)
+    else:
+        chunks = [comments[i:i + chunk_size] for i in range(0, len(comments), chunk_size)]
+        workers = min(workers, len(chunks))
+        chunk_results = pool.map(moderate_chunk_in_worker, chunks, itertools.repeat(lexicon),
+                                 itertools.repeat(matcher.lexicon_version), itertools.repeat(overlay))
+        results = [result for chunk in chunk_results for result in chunk]
+    elapsed = time.perf_counter() - start
+
+    flags = [1 if result else 0 for result in results]
+    return {
+        "count": len(results),
+        "flagged": sum(flags),
+        "flags": flags,
+        "rules": [result[0] if result else None for result in results],
+        "terms": [result[1] if result else None for result in results],
+        "workers": workers,
+        "elapsed_seconds": round(elapsed, 3),
+        "comments_per_second": round(len(results) / elapsed) if elapsed > 0 else None
+    }
+
+
+# --- Asynchronous job mode ---
+class JobQueue:
+    """
+    In-memory queue behind the /jobs endpoints. Webhook receivers enqueue a comment and get
+    a job id back immediately; worker threads run generate_reply() and store the result for
+    polling, and optionally POST it to a callback_url with retries.
+    """
+
+    def __init__(self, num_workers, max_queue_size, callback_retries, job_ttl, callback_hosts=()):
+        self.num_workers = num_workers
+        self.callback_retries = callback_retries
+        # Hosts callbacks may be POSTed to; empty disables callbacks, so a request can't make
+        # the bot POST to internal addresses
+        self.callback_hosts = {host.strip().lower() for host in callback_hosts if host.strip()}
+        self.job_ttl = job_ttl
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.workers = []
+        # Callbacks get their own threads so a slow receiver never holds up an LLM worker
+        self.callback_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="job-callback")
+
+    def start(self):
+        """Starts the worker threads on first use."""
+        with self.lock:
+            if self.workers:
+                return
+            for i in range(self.num_workers):
+                worker = threading.Thread(target=self.run_worker, name=f"job-worker-{i}", daemon=True)
+                worker.start()
+                self.workers.append(worker)
+
+    def is_allowed_callback(self, callback_url):
+        """True for http(s) URLs whose host is in JOB_CALLBACK_ALLOWED_HOSTS."""
+        try:
+            parts = urlsplit(callback_url)
+        except ValueError:
+            return False
+        return parts.scheme in ("http", "https") and (parts.hostname or "") in self.callback_hosts
+
+    def submit(self, json_data, callback_url=None):
+        """Queues a /process-comment payload. Returns the job, or None if the queue is full."""
+        self.start()
+        self.purge_expired()
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "status": "queued",
+            "comment_id": json_data["data"].get("comment_info", {}).get("comment_id", ""),
+            "callback_url": callback_url,
+            "callback_status": "pending" if callback_url else None,
+            "created_at": time.time(),
+            "finished_at": None,
+            "result": None
         }
+        with self.lock:
+            self.jobs[job_id] = job
+        try:
+            self.queue.put_nowait((job_id, json_data))
+        except queue.Full:
+            with self.lock:
+                self.jobs.pop(job_id, None)
+            return None
+        return dict(job)
+
+    def get(self, job_id):
+        """Returns a snapshot of a job, or None if it is unknown or expired."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def update(self, job_id, **fields):
+        with self.lock:
+            if job_id in self.jobs:
+                self.jobs[job_id].update(fields)
+
+    def purge_expired(self):
+        """Forgets finished jobs older than job_ttl seconds."""
+        cutoff = time.time() - self.job_ttl
+        with self.lock:
+            expired = [job_id for job_id, job in self.jobs.items()
+                       if job["finished_at"] is not None and job["finished_at"] < cutoff]
+            for job_id in expired:
+                del self.jobs[job_id]
+
+    def run_worker(self):
+        while True:
+            job_id, json_data = self.queue.get()
+            try:
+                self.update(job_id, status="running")
+                try:
+                    result = get_bot().generate_reply(json_data)
+                    status = "done"
+                except Exception as e:
+                    print(f"Job {job_id} failed: {e}")
+                    result = {"error": f"Unexpected error: {e}", "status_code": 500}
+                    status = "failed"
+                self.update(job_id, status=status, result=result, finished_at=time.time())
+
+                job = self.get(job_id)
+                if job and job["callback_url"]:
+                    self.callback_executor.submit(self.deliver_callback, job)
+            finally:
+                self.queue.task_done()
+
+    def deliver_callback(self, job):
+        """POSTs the finished job to its callback_url, retrying with exponential backoff."""
+        body = {"job_id": job["job_id"], "status": job["status"], "result": job["result"]}
+        for attempt in range(self.callback_retries + 1):
+            try:
+                response = http_session.post(job["callback_url"], json=body, timeout=10)
+                if response.status_code < 300:
+                    self.update(job["job_id"], callback_status="delivered", callback_attempts=attempt + 1)
+                    return
+                print(f"Callback for job {job['job_id']} returned {response.status_code}")
+            except requests.exceptions.RequestException as e:
+                print(f"Callback for job {job['job_id']} failed: {e}")
+            if attempt < self.callback_retries:
+                time.sleep(2 ** attempt)
+        self.update(job["job_id"], callback_status="failed", callback_attempts=self.callback_retries + 1)
+
+
+job_queue = JobQueue(
+    num_workers=int(os.getenv("JOB_WORKERS", "8")),
+    max_queue_size=int(os.getenv("JOB_QUEUE_SIZE", "10000")),
+    callback_retries=int(os.getenv("JOB_CALLBACK_RETRIES", "3")),
+    job_ttl=int(os.getenv("JOB_TTL_SECONDS", "3600")),
+    callback_hosts=os.getenv("JOB_CALLBACK_ALLOWED_HOSTS", "").split(",")
+)
+
+
+# --- ASGI serving path ---
+# Flask concurrency is bounded by thread count, and each thread idles through the LLM call.
+# asgi_app serves /process-comment on an event loop instead, so one process can hold
+# hundreds of OpenRouter calls in flight: `uvicorn finally:asgi_app`
+ASYNC_MAX_CONNECTIONS = int(os.getenv("ASYNC_MAX_CONNECTIONS", "500"))
+
+
+def create_async_client(transport=None):
+    """
+    Creates the httpx.AsyncClient used by asgi_app. Pass an httpx.MockTransport
+    (see mock_openrouter_transport) to run against a fake upstream in tests.
+    """
+    if httpx is None:
+        raise RuntimeError("httpx is required for the ASGI serving path. Install it with: pip install httpx")
+    limits = httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS, max_keepalive_connections=ASYNC_MAX_CONNECTIONS)
+    return httpx.AsyncClient(limits=limits, timeout=15, transport=transport)
+
+
+def mock_openrouter_transport(reply_text="Thank you for your comment! 😊", delay=0.0):
+    """httpx transport that answers every chat completion with `reply_text` after `delay` seconds."""
+    async def handler(request):
+        if delay:
+            await asyncio.sleep(delay)
+        return httpx.Response(200, json={
+            "choices": [{"message": {"role": "assistant", "content": reply_text}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0}
+        })
+
+    return httpx.MockTransport(handler)
+
+
+class AsyncCommentApp:
+    """
+    Minimal ASGI application serving GET / and POST /process-comment through
+    generate_reply_async(). It shares the bot from get_bot() with the Flask app.
+    Set OPENROUTER_MOCK=1 to answer from mock_openrouter_transport() instead of OpenRouter.
+    """
+
+    def __init__(self, transport=None):
+        self.transport = transport
+        self.client = None
+
+    def get_client(self):
+        if self.client is None:
+            transport = self.transport
+            if transport is None and os.getenv("OPENROUTER_MOCK") == "1":
+                transport = mock_openrouter_transport()
+            self.client = create_async_client(transport)
+        return self.client
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        method, path = scope["method"], scope["path"]
+        if path == "/" and method == "GET":
+            await self.send_response(send, 200, b"welcome", b"text/html; charset=utf-8")
+        elif path == "/process-comment" and method == "POST":
+            try:
+                data = json.loads(await self.read_body(receive) or b"null")
+            except ValueError:
+                data = None
+            error = comment_payload_error(data)
+            if error:
+                await self.send_json(send, 400, {"error": error})
+                return
+            response = await get_bot().generate_reply_async(data, self.get_client())
+            await self.send_json(send, response.get("status_code", 200), response)
+        else:
+            await self.send_json(send, 404, {"error": "Not found"})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    get_bot()
+                    self.get_client()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.client is not None:
+                    await self.client.aclose()
+                    self.client = None
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def read_body(self, receive):
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                return body
+
+    async def send_json(self, send, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        await self.send_response(send, status, body, b"application/json")
+
+    async def send_response(self, send, status, body, content_type):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode())]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+asgi_app = AsyncCommentApp()
 
 
 @app.route('/', methods=['GET'])
@@ -984,6 +3482,26 @@ def display():
     return 'welcome'
 
 
+@app.route('/upstream-stats', methods=['GET'])
+def upstream_stats():
+    """Connection reuse counters for the pooled upstream session."""
+    return jsonify(get_http_session_stats(http_session))
+
+
+@app.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    """Hit counters for the reply caches."""
+    bot = get_bot()
+    return jsonify({
+        "coalescing": bot.reply_coalescer.get_stats(),
+        "reply_cache": dict(bot.reply_cache.get_stats(), tokens_saved=bot.tokens_saved),
+        "near_duplicate_cache": bot.near_duplicate_cache.get_stats(),
+        "prompt_fragment_cache": bot.prompt_fragment_cache.get_stats(),
+        "page_overlay_cache": bot.page_overlay_cache.get_stats(),
+        "analysis_memo": {name: memo.get_stats() for name, memo in bot.analysis_memos.items()}
+    })
+
+
 @app.route('/test-slang', methods=['POST'])
 def test_slang():
     """Test endpoint to check slang detection for debugging"""
@@ -991,17 +3509,32 @@ def test_slang():
     if not data or 'text' not in data:
         return jsonify({"error": "Text is required"}), 400
 
-    bot = FacebookBot()
+    bot = get_bot()
     text = data['text']
-    slang_detected = bot.contains_slang(text)
+    slang_match = bot.find_slang(text, fuzzy_max_distance=data.get('fuzzy_max_distance'),
+                                 page_overlay=bot.get_page_overlay(data.get('page_info') or {}))
+    slang_detected = slang_match is not None
 
     return jsonify({
         "text": text,
         "slang_detected": slang_detected,
+        "slang_match": slang_match,
+        "lexicon_version": bot.lexicon_version,
         "message": "Slang detected" if slang_detected else "No slang detected"
     })
 
 
+@app.route('/reload-lexicon', methods=['POST'])
+def reload_lexicon():
+    """Reloads the slang lexicon data file now instead of waiting for the watcher."""
+    bot = get_bot()
+    previous_version = bot.lexicon_version
+    version = bot.reload_lexicon()
+    if bot.lexicon_reload_error:
+        return jsonify({"lexicon_version": version, "changed": False, "error": bot.lexicon_reload_error}), 400
+    return jsonify({"lexicon_version": version, "changed": version != previous_version})
+
+
 @app.route('/test-language', methods=['POST'])
 def test_language():
     """New test endpoint to check language detection"""
@@ -1009,13 +3542,18 @@ def test_language():
     if not data or 'text' not in data:
         return jsonify({"error": "Text is required"}), 400
 
-    bot = FacebookBot()
+    bot = get_bot()
     text = data['text']
     detected_language = bot.detect_comment_language(text)
+    model_prediction = None
+    if bot.language_model is not None:
+        label, confidence = bot.language_model.predict(text)
+        model_prediction = {"label": label, "confidence": round(confidence, 3)}
 
     return jsonify({
         "text": text,
         "detected_language": detected_language,
+        "language_model": model_prediction,
         "message": f"Language detected as: {detected_language}"
     })
 
@@ -1027,7 +3565,7 @@ def test_names():
     if not data or 'comment_text' not in data:
         return jsonify({"error": "comment_text is required"}), 400
 
-    bot = FacebookBot()
+    bot = get_bot()
     comment_text = data['comment_text']
     commenter_name = data.get('commenter_name', 'Test User')
     page_name = data.get('page_name', 'Test Page')
@@ -1047,15 +3585,143 @@ def test_names():
 
 @app.route('/process-comment', methods=['POST'])
 def process_comment():
-    data = request.get_json()
-    if not data:
-        return jsonify({"error": "Invalid JSON data"}), 400
+    data = request.get_json(silent=True)
+    error = comment_payload_error(data)
+    if error:
+        return jsonify({"error": error}), 400
 
-    bot = FacebookBot()
+    bot = get_bot()
     response = bot.generate_reply(data)
     return jsonify(response), response.get("status_code", 200)
 
 
+def get_batch_items():
+    """Reads the batch list from the request body. Returns (items, None) or (None, error response)."""
+    data = request.get_json(silent=True)
+    items = data.get("comments") if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return None, (jsonify({"error": "A non-empty list of comments is required"}), 400)
+    if len(items) > MAX_BATCH_SIZE:
+        return None, (jsonify({"error": f"Batch too large: {len(items)} comments (max {MAX_BATCH_SIZE})"}), 413)
+    return items, None
+
+
+def normalize_batch_items(items):
+    """Batch items may be full payloads ({"data": {...}}) or just the inner data object."""
+    return [item if isinstance(item, dict) and "data" in item else {"data": item} for item in items]
+
+
+@app.route('/process-comments', methods=['POST'])
+def process_comments():
+    """
+    Batch variant of /process-comment. Accepts a JSON list of the same payloads
+    (or {"comments": [...]}) and returns one result per item in input order.
+    """
+    items, error = get_batch_items()
+    if error:
+        return error
+
+    payloads = normalize_batch_items(items)
+    start_time = time.time()
+    bot = get_bot()
+    results = bot.generate_replies(payloads, llm_executor)
+    return jsonify({
+        "results": results,
+        "count": len(results),
+        "response_time": f"{time.time() - start_time:.2f}s"
+    })
+
+
+@app.route('/process-comments/stream', methods=['POST'])
+def process_comments_stream():
+    """
+    Streaming variant of /process-comments. Responds with NDJSON, one line per comment
+    in completion order, each carrying its input "index" and "comment_id".
+    """
+    items, error = get_batch_items()
+    if error:
+        return error
+
+    payloads = normalize_batch_items(items)
+    bot = get_bot()
+
+    def generate():
+        for result in bot.iter_replies(payloads, llm_executor, LLM_MAX_WORKERS * 2):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+
+@app.route('/moderate-comments', methods=['POST'])
+def moderate_comments_endpoint():
+    """
+    Bulk moderation for backfills: no replies, no comment counting. Takes {"comments": [...],
+    "page_info": {...}} (page_info optional, for the page's blocked/allowed terms), or a file
+    upload "file" with one comment per line. Returns flags and matched terms in input order.
+    """
+    page_info = {}
+    uploaded = request.files.get("file")
+    if uploaded is not None:
+        comments = [line.rstrip("\r") for line in uploaded.read().decode("utf-8", errors="replace").split("\n")
+                    if line.strip()]
+    else:
+        data = request.get_json(silent=True)
+        comments = data.get("comments") if isinstance(data, dict) else data
+        page_info = (data.get("page_info") if isinstance(data, dict) else None) or {}
+    if not isinstance(comments, list) or not comments:
+        return jsonify({"error": "A non-empty list of comments (or a file with one per line) is required"}), 400
+    if len(comments) > MAX_BULK_MODERATION_COMMENTS:
+        return jsonify({"error": f"Too many comments: {len(comments)} (max {MAX_BULK_MODERATION_COMMENTS})"}), 413
+    invalid = [i for i, comment in enumerate(comments) if not isinstance(comment, str)]
+    if invalid:
+        return jsonify({"error": "Every comment must be a string", "invalid_indexes": invalid[:100]}), 400
+
+    bot = get_bot()
+    matcher = bot.slang_matcher
+    result = moderate_comments(comments, matcher, bot.get_page_overlay(page_info), bulk_moderation_pool)
+    result["lexicon_version"] = matcher.lexicon_version
+    print(f"Bulk moderation: {result['flagged']}/{result['count']} flagged, "
+          f"{result['comments_per_second']} comments/s on {result['workers']} workers")
+    return jsonify(result)
+
+
+@app.route('/jobs', methods=['POST'])
+def enqueue_job():
+    """
+    Queues a comment and returns a job id right away (202). Takes the /process-comment
+    payload plus an optional top-level "callback_url" that receives the finished result
+    (its host must be listed in JOB_CALLBACK_ALLOWED_HOSTS).
+    """
+    data = request.get_json(silent=True)
+    error = comment_payload_error(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    callback_url = data.pop("callback_url", None)
+    if callback_url is not None and not (isinstance(callback_url, str) and job_queue.is_allowed_callback(callback_url)):
+        return jsonify({"error": "callback_url must be an http(s) URL on a host in JOB_CALLBACK_ALLOWED_HOSTS"}), 400
+
+    job = job_queue.submit(data, callback_url)
+    if job is None:
+        return jsonify({"error": "Job queue is full, try again later"}), 503
+
+    return jsonify({
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "comment_id": job["comment_id"],
+        "status_url": f"/jobs/{job['job_id']}"
+    }), 202
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Polls a job queued through POST /jobs."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+
 if __name__ == '__main__':
     # For production deployment, remove debug=True
     # Ensure OPENAI_API_KEY or OPENROUTER_API_KEY is set in your .env file or environment variables
@@ -1063,5 +3729,6 @@ if __name__ == '__main__':
         print(
             "Error: OPENAI_API_KEY or OPENROUTER_API_KEY environment variable not set. Please set it in a .env file or your system environment.")
     else:
+        get_bot()  # Build the shared bot at startup instead of on the first request
         # For production, use: app.run(host="0.0.0.0", port=5000)
-        app.run(debug=False, host="0.0.0.0", port=5000)
\ No newline at end of file
+        app.run(debug=False, host="0.0.0.0", port=5000, threaded=True)
\ No newline at end of file
@@ -0,0 +1,77 @@
+"""
+Trains the romanized-language classifier (LanguageModel in finally.py) on labeled comments and
+writes it to LANGUAGE_MODEL_PATH, where FacebookBot loads it at startup. Needs NumPy.
+
+Usage:
+    python train_language_model.py samples.tsv [--output language_model.npz] [--holdout 0.1]
+
+Samples are one per line, either "label<TAB>text" or JSON {"label": ..., "text": ...}.
+Labels should be the codes detect_language() returns ("bangla", "hindi", "english", ...).
+Only Latin-script comments reach the model, so train it on romanized text such as "kmon asen?".
+"""
+import argparse
+import importlib
+import json
+import random
+import time
+
+# "finally" is a Python keyword, so the bot module can't be imported with a plain import statement
+bot_module = importlib.import_module("finally")
+
+
+def read_samples(path):
+    samples = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                record = json.loads(line)
+                label, text = record["label"], record["text"]
+            else:
+                label, _, text = line.partition("\t")
+            if not text:
+                raise SystemExit(f"{path}:{line_number}: expected 'label<TAB>text' or a JSON object")
+            samples.append((text, label.strip().lower()))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the romanized language classifier")
+    parser.add_argument("samples", help="Labeled samples (TSV or JSON lines)")
+    parser.add_argument("--output", default=bot_module.LANGUAGE_MODEL_PATH,
+                        help="Model path (default: LANGUAGE_MODEL_PATH)")
+    parser.add_argument("--features", type=int, default=2 ** 16, help="Hashed feature buckets")
+    parser.add_argument("--alpha", type=float, default=0.1, help="Naive Bayes smoothing")
+    parser.add_argument("--holdout", type=float, default=0.1, help="Fraction held out for evaluation")
+    args = parser.parse_args()
+    if bot_module.np is None:
+        raise SystemExit("NumPy is required to train the language model")
+
+    samples = read_samples(args.samples)
+    unknown = sorted({label for _, label in samples} - set(bot_module.LANGUAGE_LABELS))
+    if unknown:
+        print(f"Warning: labels {unknown} are not detect_language() codes")
+    random.Random(0).shuffle(samples)
+    holdout = samples[:int(len(samples) * args.holdout)]
+    training = samples[len(holdout):]
+
+    start = time.perf_counter()
+    model = bot_module.LanguageModel.train(training, num_features=args.features, alpha=args.alpha)
+    print(f"Trained on {len(training)} samples, labels {model.labels} "
+          f"({(time.perf_counter() - start) * 1000:.0f}ms)")
+
+    if holdout:
+        start = time.perf_counter()
+        correct = sum(model.predict(text)[0] == label for text, label in holdout)
+        elapsed = time.perf_counter() - start
+        print(f"Holdout accuracy {correct / len(holdout):.1%} on {len(holdout)} samples, "
+              f"{elapsed / len(holdout) * 1e6:.0f}us per prediction")
+
+    model.save(args.output)
+    print(f"Wrote language model to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Pooled HTTP session for upstream calls, shared by finally.py and withou_slang.py.
+
+One keep-alive session for every OpenRouter call (and job callbacks), so each comment reuses
+an open TLS connection instead of paying DNS, TCP and TLS setup again.
+"""
+import os
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+# The importing bot may not have loaded its .env yet
+load_dotenv()
+
+UPSTREAM_POOL_SIZE = int(os.getenv("UPSTREAM_POOL_SIZE", "32"))
+UPSTREAM_WARMUP_CONNECTIONS = int(os.getenv("UPSTREAM_WARMUP_CONNECTIONS", "4"))
+
+
+def create_http_session(pool_size):
+    """Creates a requests.Session whose connection pool keeps up to `pool_size` connections per host alive."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def warm_up_http_session(session, url, connections):
+    """
+    Opens `connections` connections to the host of `url` in parallel so the first comments
+    don't pay the handshake. Failures are only logged; warm-up is best effort.
+    """
+    def touch(_):
+        try:
+            session.head(url, timeout=5)
+        except requests.exceptions.RequestException as e:
+            print(f"Connection warm-up to {url} failed: {e}")
+
+    with ThreadPoolExecutor(max_workers=max(connections, 1)) as warmup_executor:
+        list(warmup_executor.map(touch, range(connections)))
+    print(f"Warmed up upstream connections: {get_http_session_stats(session)}")
+
+
+def get_http_session_stats(session):
+    """
+    Returns request and connection counters summed over the session's connection pools.
+    Every request beyond the number of opened connections reused a kept-alive one.
+    """
+    requests_sent = 0
+    connections_opened = 0
+    for adapter in set(session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                requests_sent += pool.num_requests
+                connections_opened += pool.num_connections
+    connections_reused = max(requests_sent - connections_opened, 0)
+    return {
+        "requests": requests_sent,
+        "connections_opened": connections_opened,
+        "connections_reused": connections_reused,
+        "reuse_ratio": round(connections_reused / requests_sent, 3) if requests_sent else 0.0,
+        "pool_size": UPSTREAM_POOL_SIZE
+    }
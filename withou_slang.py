@@ -6,12 +6,18 @@ import time
 from datetime import datetime
 from dotenv import load_dotenv
 import tiktoken  # Library for token counting
+from upstream_http import (UPSTREAM_POOL_SIZE, UPSTREAM_WARMUP_CONNECTIONS, create_http_session,
+                           get_http_session_stats, warm_up_http_session)
 
 # Load environment variables from .env file
 load_dotenv()
 
 app = Flask(__name__)
 
+# --- Pooled HTTP session for upstream calls ---
+# One keep-alive session for every OpenRouter call, shared with finally.py through upstream_http.py.
+http_session = create_http_session(UPSTREAM_POOL_SIZE)
+
 
 class FacebookBot:
     def __init__(self):
@@ -34,6 +40,9 @@ class FacebookBot:
             "X-Title": "Facebook Comment Bot"  # Optional: your app name
         }
 
+        # Shared keep-alive session for OpenRouter calls
+        self.session = http_session
+
         # Initialize the tokenizer for the chosen model
         try:
             self.tokenizer = tiktoken.encoding_for_model(self.model)
@@ -314,7 +323,7 @@ class FacebookBot:
                 "response_format": {"type": "json_object"}
             }
 
-            response = requests.post(self.base_url, headers=self.headers, json=payload, timeout=15)
+            response = self.session.post(self.base_url, headers=self.headers, json=payload, timeout=15)
 
             if response.status_code == 200:
                 analysis_result = response.json()
@@ -537,7 +546,7 @@ class FacebookBot:
                 "top_p": 0.9,
                 "stop": ["\n\n", "Commenter:", "User:"]  # Common stop sequences
             }
-            response = requests.post(self.base_url, headers=self.headers, json=payload, timeout=15)
+            response = self.session.post(self.base_url, headers=self.headers, json=payload, timeout=15)
 
             # Handle specific HTTP errors
             if response.status_code == 402:
@@ -623,6 +632,12 @@ def display():
     return 'welcome'
 
 
+@app.route('/upstream-stats', methods=['GET'])
+def upstream_stats():
+    """Connection reuse counters for the pooled upstream session."""
+    return jsonify(get_http_session_stats(http_session))
+
+
 @app.route('/test-analysis', methods=['POST'])
 def test_analysis():
     """Test endpoint to check GPT-based content analysis for debugging"""
@@ -659,5 +674,8 @@ if __name__ == '__main__':
         print(
             "Error: OPENAI_API_KEY or OPENROUTER_API_KEY environment variable not set. Please set it in a .env file or your system environment.")
     else:
+        if UPSTREAM_WARMUP_CONNECTIONS > 0:
+            warm_up_http_session(http_session, "https://openrouter.ai/api/v1/chat/completions",
+                                 UPSTREAM_WARMUP_CONNECTIONS)
         # For production, use: app.run(host="0.0.0.0", port=5000)
         app.run(debug=False, host="0.0.0.0", port=5000)
\ No newline at end of file